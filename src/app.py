@@ -1,14 +1,18 @@
 import os
 import shutil
+import asyncio
 import streamlit as st
+import numpy as np
+import pandas as pd
 from pathlib import Path
 import yaml
 from dotenv import load_dotenv
 
-from config import AppConfig
-from github_service import GitHubService
-from translation_service import TranslationService
+from config import AppConfig, YamlLoader, get_config
+from github_service import get_github_service, cached_list_files, parse_github_url
+from translation_service import TranslationService, MAX_CONCURRENT_TRANSLATIONS
 from llm_factory import LLMFactory
+from ui_utils import parse_glossary_bytes, remember_translation, reset_editor
 
 # Load environment variables
 load_dotenv()
@@ -76,68 +80,124 @@ def load_glossary(file_path: str) -> dict:
     if not file_path or not os.path.exists(file_path):
         return {}
     
+    return _read_glossary(file_path, os.path.getmtime(file_path))
+
+@st.cache_data(show_spinner=False)
+def _read_glossary(file_path: str, mtime: float) -> dict:
+    """Parse a glossary file; mtime is part of the cache key so edits are picked up."""
     with open(file_path, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
+        return yaml.load(f, Loader=YamlLoader)
 
 def initialize_session_state():
     """Initialize session state variables."""
-    if 'downloaded_files' not in st.session_state:
-        st.session_state.downloaded_files = []
+    # Downloaded file metadata and a parallel boolean array of which files are selected
+    if 'file_meta' not in st.session_state:
+        st.session_state.file_meta = []
+    if 'file_selected' not in st.session_state:
+        st.session_state.file_selected = np.zeros(0, dtype=bool)
     if 'base_input_dir' not in st.session_state:
         st.session_state.base_input_dir = "input_files"
     if 'base_output_dir' not in st.session_state:
         st.session_state.base_output_dir = "output_files"
+    if 'translated_contents' not in st.session_state:
+        st.session_state.translated_contents = {}
 
 def cleanup_translated_file(file_path: str):
     """Remove file after translation."""
     try:
         os.remove(file_path)
-        # Remove empty parent directories
-        parent = os.path.dirname(file_path)
-        while parent and not os.listdir(parent):
-            os.rmdir(parent)
-            parent = os.path.dirname(parent)
     except Exception as e:
         st.warning(f"Could not remove temporary file {file_path}: {str(e)}")
 
-def main():
-    initialize_session_state()
+def cleanup_empty_dirs(root_dir: str):
+    """Remove directories under root_dir left empty by translation, deepest first."""
+    for root, dirs, files in os.walk(root_dir, topdown=False):
+        if files or root == root_dir:
+            continue
+        try:
+            os.rmdir(root)
+        except OSError:
+            # Still holds non-empty subdirectories
+            pass
+
+async def _translate_one(semaphore: asyncio.Semaphore, translation_service: TranslationService,
+                         file_info: dict, base_output_dir: str, translation_folder: str) -> tuple:
+    """Translate one file under the semaphore, returning (file_info, output_path, content, error)."""
+    async with semaphore:
+        try:
+            output_path, content = await translation_service.process_file_async(
+                file_info['path'],
+                base_output_dir,
+                translation_folder
+            )
+            return file_info, output_path, content, None
+        except Exception as e:
+            return file_info, None, None, e
+
+async def translate_files(translation_service: TranslationService, selected_files: list,
+                          base_output_dir: str, translation_folder: str, on_result):
+    """Translate files concurrently, calling on_result(done, file_info, output_path, content, error)
+    as each one finishes."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TRANSLATIONS)
+    async with asyncio.TaskGroup() as tg:
+        tasks = [
+            tg.create_task(_translate_one(
+                semaphore, translation_service, file_info, base_output_dir, translation_folder
+            ))
+            for file_info in selected_files
+        ]
+        for done, next_result in enumerate(asyncio.as_completed(tasks), 1):
+            on_result(done, *await next_result)
+
+@st.fragment
+def sidebar_config():
+    """LLM, GitHub and glossary settings, shared with the other sections via session state."""
+    config = get_config()
+    st.header("Configuration")
     
-    # Sidebar configuration
-    with st.sidebar:
-        st.header("Configuration")
-        
-        # LLM Selection
-        llm_provider = st.selectbox(
-            "Select LLM Provider",
-            ["gemini", "cohere", "groq", "together"],
-            index=0
-        )
-        
-        api_key = st.text_input(
-            f"{llm_provider.title()} API Key",
-            type="password",
-            value=os.getenv(f"{llm_provider.upper()}_API_KEY", "")
-        )
-        
-        # Available models for selected provider
-        models = LLMFactory.get_available_models()[llm_provider]
-        model_name = st.selectbox("Select Model", models)
-        
-        # GitHub configuration
-        github_token = st.text_input(
-            "GitHub Token (optional)",
-            type="password",
-            value=os.getenv("GITHUB_TOKEN", "")
-        )
-        
-        # Glossary file
-        glossary_file = st.file_uploader(
-            "Upload Translation Glossary (YAML)",
-            type=['yaml', 'yml']
-        )
+    # LLM Selection
+    llm_provider = st.selectbox(
+        "Select LLM Provider",
+        ["gemini", "cohere", "groq", "together"],
+        index=0
+    )
+    
+    api_key = st.text_input(
+        f"{llm_provider.title()} API Key",
+        type="password",
+        value=config.api_keys.get(llm_provider, "")
+    )
+    
+    # Available models for selected provider
+    models = LLMFactory.get_available_models()[llm_provider]
+    model_name = st.selectbox("Select Model", models)
+    
+    # GitHub configuration
+    github_token = st.text_input(
+        "GitHub Token (optional)",
+        type="password",
+        value=config.github_token
+    )
+    
+    # Glossary file
+    glossary_file = st.file_uploader(
+        "Upload Translation Glossary (YAML)",
+        type=['yaml', 'yml']
+    )
+    
+    st.session_state.translation_settings = {
+        'llm_provider': llm_provider,
+        'api_key': api_key,
+        'model_name': model_name,
+        'glossary_file': glossary_file
+    }
+    st.session_state.github_token = github_token
 
-    # Main content
+@st.fragment
+def fetch_panel():
+    """Repository inputs and the Fetch Files button."""
+    github_token = st.session_state.github_token
+    
     col1, col2 = st.columns(2)
     with col1:
         repo_url = st.text_input("GitHub Repository URL")
@@ -149,8 +209,8 @@ def main():
     # Input/Output directory configuration
     if repo_url:
         try:
-            github_service = GitHubService(github_token)
-            _, repo_name = github_service.get_repository_info(repo_url)
+            # Parsed locally; the repository is only contacted on Fetch Files
+            _, repo_name, *_ = parse_github_url(repo_url)
             
             col1, col2 = st.columns(2)
             with col1:
@@ -160,7 +220,7 @@ def main():
                     help="Folder name under input_files/"
                 )
             with col2:
-                translation_folder = st.text_input(
+                st.session_state.translation_folder = st.text_input(
                     "Translation Output Folder",
                     value=repo_name,
                     help="Folder name under output_files/"
@@ -169,6 +229,11 @@ def main():
             st.error(f"Invalid repository URL: {str(e)}")
             return
     
+    # Shown after the rerun that follows a successful fetch
+    fetch_message = st.session_state.pop('fetch_message', None)
+    if fetch_message:
+        st.success(fetch_message)
+    
     # Fetch files button
     if st.button("Fetch Files", type="secondary"):
         if not repo_url:
@@ -177,128 +242,187 @@ def main():
             
         try:
             with st.spinner("Fetching files from repository..."):
-                github_service = GitHubService(github_token)
-                files = github_service.get_repository_files(
-                    repo_url=repo_url,
-                    branch=branch,
-                    folder_path=folder_path,
-                    file_path=file_path,
-                    file_types=AppConfig.supported_file_types
+                github_service = get_github_service(github_token)
+                files = cached_list_files(
+                    github_token,
+                    repo_url,
+                    branch,
+                    folder_path,
+                    file_path,
+                    AppConfig.supported_file_types
                 )
                 
                 if not files:
                     st.warning("No supported files found in the specified path.")
                     return
                 
-                # Download files
-                st.session_state.downloaded_files = []
-                for file in files:
-                    local_path = github_service.download_file(
-                        file,
-                        st.session_state.base_input_dir,
-                        download_folder
-                    )
-                    st.session_state.downloaded_files.append({
+                # Download files concurrently, relative to folder_path as the Download page does
+                local_paths = asyncio.run(github_service.download_files_async(
+                    files,
+                    st.session_state.base_input_dir,
+                    download_folder,
+                    folder_path
+                ))
+                st.session_state.file_meta = [
+                    {
                         'path': local_path,
-                        'name': file.path,
-                        'selected': True
-                    })
+                        'name': file['path']
+                    }
+                    for file, local_path in zip(files, local_paths)
+                ]
+                st.session_state.file_selected = np.ones(len(files), dtype=bool)
+                reset_editor("files_editor")
                 
-                st.success(f"Successfully fetched {len(files)} files!")
+                st.session_state.fetch_message = f"Successfully fetched {len(files)} files!"
         
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
-
-    # Display downloaded files
-    if st.session_state.downloaded_files:
-        st.subheader("Available Files")
-        
-        # Select/Deselect All
-        col1, col2 = st.columns([1, 4])
-        with col1:
-            select_all = st.checkbox("Select All", value=True)
-        
-        # Update all checkboxes based on select_all
-        if select_all:
-            for file in st.session_state.downloaded_files:
-                file['selected'] = True
-        
-        # File selection
-        st.markdown("<div class='file-list'>", unsafe_allow_html=True)
-        for file in st.session_state.downloaded_files:
-            file['selected'] = st.checkbox(
-                file['name'],
-                value=file['selected']
-            )
-        st.markdown("</div>", unsafe_allow_html=True)
+            return
         
-        # Translation button
-        if st.button("Start Translation", type="primary"):
-            if not translation_folder:
-                st.error("Please specify a translation output folder name.")
+        # The file list lives in another fragment, so rerun the whole page
+        st.rerun()
+
+@st.fragment
+def files_and_translate():
+    """Downloaded file selection and the translation run."""
+    if not st.session_state.file_meta:
+        return
+    
+    st.subheader("Available Files")
+    
+    # Select All / Deselect All reset any pending edits in the table
+    col1, col2, col3 = st.columns([1, 1, 3])
+    with col1:
+        if st.button("Select All"):
+            st.session_state.file_selected[:] = True
+            reset_editor("files_editor")
+            st.rerun(scope="fragment")
+    with col2:
+        if st.button("Deselect All"):
+            st.session_state.file_selected[:] = False
+            reset_editor("files_editor")
+            st.rerun(scope="fragment")
+    
+    # File selection in a single table widget rather than one checkbox per file,
+    # built from file_selected (see reset_editor)
+    files_df = pd.DataFrame(st.session_state.file_meta)[['name', 'path']]
+    files_df.insert(0, 'selected', st.session_state.file_selected)
+    edited_files = st.data_editor(
+        files_df,
+        column_config={
+            "selected": st.column_config.CheckboxColumn("Include"),
+            "name": st.column_config.TextColumn("File"),
+            "path": st.column_config.TextColumn("Local Path")
+        },
+        disabled=["name", "path"],
+        hide_index=True,
+        use_container_width=True,
+        key="files_editor"
+    )
+    selected_mask = edited_files['selected'].to_numpy(dtype=bool)
+    
+    # Translation button
+    if st.button("Start Translation", type="primary"):
+        translation_folder = st.session_state.get('translation_folder')
+        if not translation_folder:
+            st.error("Please specify a translation output folder name.")
+            return
+            
+        try:
+            selected_files = [st.session_state.file_meta[i]
+                              for i in np.flatnonzero(selected_mask)]
+            
+            if not selected_files:
+                st.warning("Please select at least one file to translate.")
                 return
+            
+            # Small files share LLM requests instead of sending one each
+            batch = all(TranslationService.can_batch(f['path']) for f in selected_files)
+            
+            settings = st.session_state.translation_settings
+            with st.spinner("Setting up translation service..."):
+                # Create LLM instance; the async path runs on a new event loop, so it
+                # can't reuse the cached client
+                llm = LLMFactory.create_llm(
+                    settings['llm_provider'],
+                    settings['api_key'],
+                    model_name=settings['model_name'],
+                    cached=batch
+                )
                 
-            try:
-                selected_files = [f for f in st.session_state.downloaded_files 
-                                if f['selected']]
-                
-                if not selected_files:
-                    st.warning("Please select at least one file to translate.")
-                    return
+                # Load glossary if provided
+                glossary = {}
+                if settings['glossary_file']:
+                    glossary = parse_glossary_bytes(settings['glossary_file'].getvalue())
                 
-                with st.spinner("Setting up translation service..."):
-                    # Create LLM instance
-                    llm = LLMFactory.create_llm(
-                        llm_provider,
-                        api_key,
-                        model_name=model_name
+                translation_service = TranslationService(llm, glossary)
+            
+            # Create progress containers
+            files_progress = st.empty()
+            current_file = st.empty()
+            progress_bar = st.progress(0)
+            
+            # Process files
+            total_files = len(selected_files)
+            current_file.text(f"Translating {total_files} files...")
+            translated_paths = set()
+            
+            def on_result(done, file_info, output_path, content, error):
+                if error is None:
+                    files_progress.success(
+                        f"✅ Translated: {file_info['name']} → {output_path}"
                     )
+                    remember_translation(output_path, content)
                     
-                    # Load glossary if provided
-                    glossary = {}
-                    if glossary_file:
-                        glossary_content = glossary_file.read().decode()
-                        glossary = yaml.safe_load(glossary_content)
-                    
-                    translation_service = TranslationService(llm, glossary)
-                
-                # Create progress containers
-                files_progress = st.empty()
-                current_file = st.empty()
-                progress_bar = st.progress(0)
-                
-                # Process files
-                total_files = len(selected_files)
-                for i, file_info in enumerate(selected_files, 1):
-                    current_file.text(f"Processing: {file_info['name']}")
-                    
-                    try:
-                        # Translate file
-                        output_path = translation_service.process_file(
-                            file_info['path'],
-                            st.session_state.base_output_dir,
-                            translation_folder
-                        )
-                        files_progress.success(
-                            f"✅ Translated: {file_info['name']} → {output_path}"
-                        )
-                        
-                        # Clean up translated file
-                        cleanup_translated_file(file_info['path'])
-                        st.session_state.downloaded_files.remove(file_info)
-                        
-                    except Exception as e:
-                        files_progress.error(
-                            f"❌ Error processing {file_info['name']}: {str(e)}"
-                        )
-                    
-                    # Update progress
-                    progress_bar.progress(i / total_files)
-                
-                st.success(f"Translation completed! Check {st.session_state.base_output_dir}/{translation_folder} for translated files.")
+                    # Clean up translated file
+                    cleanup_translated_file(file_info['path'])
+                    translated_paths.add(file_info['path'])
+                else:
+                    files_progress.error(
+                        f"❌ Error processing {file_info['name']}: {str(error)}"
+                    )
                 
-            except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
+                # Update progress
+                progress_bar.progress(done / total_files)
+            
+            if batch:
+                outcomes = translation_service.process_files_batch(
+                    [f['path'] for f in selected_files],
+                    st.session_state.base_output_dir,
+                    translation_folder
+                )
+                for done, (file_info, outcome) in enumerate(zip(selected_files, outcomes), 1):
+                    on_result(done, file_info, *outcome)
+            else:
+                asyncio.run(translate_files(
+                    translation_service,
+                    selected_files,
+                    st.session_state.base_output_dir,
+                    translation_folder,
+                    on_result
+                ))
+            cleanup_empty_dirs(st.session_state.base_input_dir)
+            
+            # Drop translated files from both the metadata list and the selection array
+            keep = np.array([f['path'] not in translated_paths for f in st.session_state.file_meta], dtype=bool)
+            st.session_state.file_meta = [f for f, kept in zip(st.session_state.file_meta, keep) if kept]
+            # The editor is reset below, so carry the current selection of the remaining files over
+            st.session_state.file_selected = selected_mask[keep]
+            reset_editor("files_editor")
+            
+            st.success(f"Translation completed! Check {st.session_state.base_output_dir}/{translation_folder} for translated files.")
+            
+        except Exception as e:
+            st.error(f"An error occurred: {str(e)}")
+
+def main():
+    initialize_session_state()
+    
+    # Each section is a fragment, so interacting with one reruns only that section
+    with st.sidebar:
+        sidebar_config()
+    fetch_panel()
+    files_and_translate()
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,14 @@
+import os
 from dataclasses import dataclass
 from typing import Dict, Optional
 import yaml
+import streamlit as st
+
+# libyaml's C parser is much faster; fall back to the pure-Python one when missing
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 
 @dataclass
 class AppConfig:
@@ -13,10 +21,35 @@ class AppConfig:
     
     # Translation settings
     glossary_path: Optional[str] = None
+    input_directory: str = "input_files"
     output_directory: str = "translated_files"
+    translated_output_directory: str = "translated_files"
+    
+    # Credentials, read from the environment in __post_init__
+    api_keys: Dict[str, str] = None
+    github_token: str = ""
+    
+    def __post_init__(self):
+        self.supported_file_types = tuple(self.supported_file_types)
+        if self.api_keys is None:
+            # e.g. GEMINI_API_KEY -> api_keys["gemini"]
+            self.api_keys = {
+                name[:-len("_API_KEY")].lower(): value
+                for name, value in os.environ.items()
+                if name.endswith("_API_KEY")
+            }
+        if not self.github_token:
+            self.github_token = os.getenv("GITHUB_TOKEN", "")
     
     @classmethod
     def load_from_yaml(cls, config_path: str) -> 'AppConfig':
         with open(config_path, 'r', encoding='utf-8') as f:
-            config_data = yaml.safe_load(f)
+            config_data = yaml.load(f, Loader=YamlLoader)
         return cls(**config_data)
+
+@st.cache_resource(show_spinner=False)
+def get_config(config_path: str = "config.yaml") -> AppConfig:
+    """Load the app configuration once per process rather than on every rerun."""
+    if os.path.exists(config_path):
+        return AppConfig.load_from_yaml(config_path)
+    return AppConfig()
@@ -1,57 +1,162 @@
 import os
+import re
+import asyncio
+import hashlib
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
-from github import Github, GithubException
-from urllib.parse import urlparse
+from typing import Callable, Optional
+from github import Github, GithubException, InputGitTreeElement
+from urllib.parse import quote
 import base64
+import aiohttp
+import streamlit as st
 from config import AppConfig
 
+# Upper bound on simultaneous raw.githubusercontent.com requests
+MAX_CONCURRENT_DOWNLOADS = 10
+# Attempts per file before giving up on a rate-limited (429) download
+MAX_DOWNLOAD_RETRIES = 5
+# Bytes copied per read when streaming a download to disk
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Parallel blob uploads when committing translated files
+MAX_CONCURRENT_UPLOADS = 16
+# Attempts per blob, and the GitHub statuses worth retrying
+MAX_UPLOAD_RETRIES = 5
+RETRYABLE_STATUSES = (429, 502, 503, 504)
+# Bytes read per step when base64-encoding a file for upload; a multiple of 3
+BASE64_READ_SIZE = 3 * 64 * 1024
+# Kept in the download base dir; maps each downloaded file to its blob sha
+SHA_CACHE_FILE = ".sha_cache.json"
+
+def git_blob_sha(data: bytes) -> str:
+    """Return the git blob id of data, as GitHub reports it for files."""
+    sha = hashlib.sha1(f"blob {len(data)}\0".encode())
+    sha.update(data)
+    return sha.hexdigest()
+
+def git_file_sha(path) -> str:
+    """git_blob_sha for a file on disk, hashed in chunks rather than read whole."""
+    sha = hashlib.sha1(f"blob {os.path.getsize(path)}\0".encode())
+    with open(path, 'rb') as f:
+        while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def file_base64(path) -> str:
+    """Base64-encode a file chunk by chunk, so its raw bytes are never all in memory.
+    
+    Chunks are a multiple of 3 bytes, so the encoded pieces concatenate without padding.
+    """
+    parts = []
+    with open(path, 'rb') as f:
+        while chunk := f.read(BASE64_READ_SIZE):
+            parts.append(base64.b64encode(chunk).decode('ascii'))
+    return ''.join(parts)
+
+# owner/repo, optionally followed by /tree|blob/<branch> and/or a path
+_URL_RE = re.compile(
+    r"^(?:(?:https?://)?(?:www\.)?github\.com/)?"
+    r"(?P<owner>[^/\s]+)/(?P<repo>[^/\s]+?)(?:\.git)?"
+    r"(?:/(?:tree|blob)/(?P<branch>[^/]+))?"
+    r"(?:/(?P<path>.*?))?/*$"
+)
+
+@lru_cache(maxsize=512)
+def parse_github_url(url: str) -> tuple:
+    """Parse GitHub URL to extract owner, repo, branch, and path.
+    Example:
+        Input: https://github.com/huggingface/transformers/tree/main/docs/source/en/tasks
+        Output: ('huggingface', 'transformers', 'main', 'docs/source/en/tasks')
+    """
+    match = _URL_RE.match(url.strip())
+    if not match:
+        raise ValueError("Invalid GitHub URL format. Must contain owner and repository name.")
+    
+    return match['owner'], match['repo'], match['branch'] or "main", match['path'] or ""
+
+
 class GitHubService:
     def __init__(self, token=None):
         """Initialize GitHub service with optional token."""
+        self.token = token
         self.github = Github(token) if token else Github()
 
-    def parse_github_url(self, url: str) -> tuple:
-        """Parse GitHub URL to extract owner, repo, branch, and path.
-        Example:
-            Input: https://github.com/huggingface/transformers/tree/main/docs/source/en/tasks
-            Output: ('huggingface', 'transformers', 'main', 'docs/source/en/tasks')
+    @staticmethod
+    def _file_entry(path: str, sha: str, size: int, download_url: str, content: str = None) -> dict:
+        """Build the lightweight file record returned by get_repository_files.
+        
+        content (base64) is only kept when there is no download_url to stream from.
         """
-        try:
-            # Remove 'https://github.com/' if present
-            if 'github.com' in url:
-                url = url.split('github.com/')[-1]
-            
-            # Split the remaining path
-            parts = url.strip('/').split('/')
-            
-            if len(parts) < 2:
-                raise ValueError("Invalid GitHub URL format. Must contain owner and repository name.")
-            
-            owner = parts[0]
-            repo = parts[1]
-            
-            # Handle tree/blob paths
-            if len(parts) > 2:
-                if parts[2] == 'tree' or parts[2] == 'blob':
-                    branch = parts[3]
-                    folder_path = '/'.join(parts[4:]) if len(parts) > 4 else ""
-                else:
-                    branch = "main"
-                    folder_path = '/'.join(parts[2:])
-            else:
-                branch = "main"
-                folder_path = ""
-            
-            return owner, repo, branch, folder_path
-            
-        except Exception as e:
-            raise ValueError(f"Invalid GitHub URL format: {str(e)}")
+        entry = {
+            'path': path,
+            'sha': sha,
+            'size': size,
+            'download_url': download_url
+        }
+        if not download_url:
+            entry['content'] = content
+        return entry
+
+    def _list_tree_recursive(self, repo, branch: str, prefix: str, file_types: tuple):
+        """List matching files with a single recursive Git Trees API call.
+        
+        Returns None when GitHub truncates the tree, so the caller can fall back
+        to walking directories one by one.
+        """
+        tree = repo.get_git_tree(sha=branch, recursive=True)
+        if tree.raw_data.get('truncated', False):
+            return None
+        
+        # A path naming a single file (e.g. from a blob URL) matches only that file
+        target = prefix.strip('/')
+        prefix = target + '/' if target else ''
+        
+        files = []
+        for entry in tree.tree:
+            if entry.type != "blob" or not (entry.path.startswith(prefix) or entry.path == target):
+                continue
+            if entry.path.lower().endswith(file_types):
+                files.append(self._file_entry(
+                    entry.path,
+                    entry.sha,
+                    entry.size,
+                    f"https://raw.githubusercontent.com/{repo.full_name}/{branch}/{quote(entry.path)}"
+                ))
+        return files
 
-    def get_repository_files(self, repo_url: str, branch: str, folder_path: str = "", file_types=None) -> list:
-        """Get list of files from repository matching specified criteria."""
+    def _get_files_recursive(self, repo, branch: str, path: str, file_types: tuple) -> list:
+        """List matching files by walking directories through the Contents API."""
+        files = []
+        contents = repo.get_contents(path, ref=branch)
+        if not isinstance(contents, list):
+            contents = [contents]
+        
+        while contents:
+            file_content = contents.pop(0)
+            if file_content.type == "dir":
+                contents.extend(repo.get_contents(file_content.path, ref=branch))
+            elif file_content.path.lower().endswith(file_types):
+                files.append(self._file_entry(
+                    file_content.path,
+                    file_content.sha,
+                    file_content.size,
+                    file_content.download_url,
+                    None if file_content.download_url else file_content.content
+                ))
+        return files
+
+    def get_repository_files(self, repo_url: str, branch: str, folder_path: str = "", file_path: str = "", file_types=None) -> list:
+        """Get list of files from repository matching specified criteria.
+        
+        Each file is returned as a dict with 'path', 'sha', 'size' and 'download_url'.
+        """
         try:
             # Parse the repository URL
-            owner, repo_name = self.parse_github_url(repo_url)[:2]
+            owner, repo_name = parse_github_url(repo_url)[:2]
             
             # Clean the repository path
             repo_path = f"{owner}/{repo_name}"
@@ -60,149 +165,290 @@ class GitHubService:
             
             # Get the repository
             repo = self.github.get_repo(repo_path)
+            branch = branch or repo.default_branch
             
             # Use AppConfig's supported file types by default
             if not file_types:
                 file_types = AppConfig.supported_file_types
+            file_types = tuple(ext.lower() for ext in file_types)
             
-            files = []
             try:
-                if folder_path:
-                    contents = repo.get_contents(folder_path, ref=branch)
-                else:
-                    contents = repo.get_contents("", ref=branch)
+                if file_path:
+                    # A specific file only needs a single Contents API lookup
+                    target = f"{folder_path.strip('/')}/{file_path}" if folder_path.strip('/') else file_path
+                    return self._get_files_recursive(repo, branch, target, file_types)
                 
-                while contents:
-                    file_content = contents.pop(0)
-                    if file_content.type == "dir":
-                        contents.extend(repo.get_contents(file_content.path, ref=branch))
-                    else:
-                        if any(file_content.path.lower().endswith(ext.lower()) for ext in file_types):
-                            files.append(file_content)
+                try:
+                    files = self._list_tree_recursive(repo, branch, folder_path, file_types)
+                except GithubException as e:
+                    # The tree lookup is the first request against the ref, so a
+                    # 404 here means the branch itself doesn't exist
+                    if e.status == 404:
+                        raise ValueError(f"Branch '{branch}' not found")
+                    raise
+                if files is None:
+                    files = self._get_files_recursive(repo, branch, folder_path, file_types)
             
             except GithubException as e:
                 raise Exception(f"Error accessing repository: {str(e)}")
             
             return files
         
+        except ValueError:
+            raise
         except Exception as e:
             raise Exception(f"Error fetching repository files: {str(e)}")
 
-    def download_file(self, file_content, base_dir: str, owner: str, repo: str, branch: str, folder_path: str) -> str:
-        """Download file from repository and save to local directory."""
+    @staticmethod
+    def local_path(file: dict, base_dir: str, folder: str, folder_path: str = "") -> Path:
+        """Return where a repository file is stored locally.
+        
+        Files are placed under base_dir/folder, keeping their path relative to
+        folder_path (or their full repository path when folder_path is empty).
+        """
+        file_path = file['path']
+        folder_path = folder_path.strip('/')
+        if folder_path and file_path.startswith(folder_path + '/'):
+            file_path = file_path[len(folder_path):].lstrip('/')
+        elif folder_path and file_path == folder_path:
+            # folder_path named the file itself
+            file_path = file_path.rsplit('/', 1)[-1]
+        return Path(base_dir) / folder / file_path
+
+    def prepare_download_tree(self, files: list, base_dir: str, folder: str, folder_path: str = ""):
+        """Create every parent directory needed by files, once per unique directory."""
+        dirs = {self.local_path(file, base_dir, folder, folder_path).parent for file in files}
+        for directory in dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _load_sha_cache(base_dir: str) -> dict:
+        """Load the local path -> blob sha record of previous downloads."""
         try:
-            # Get the file's path relative to the folder_path
-            file_path = file_content.path
-            if folder_path and file_path.startswith(folder_path):
-                relative_path = file_path[len(folder_path):].lstrip('/')
-            else:
-                relative_path = file_path
-            
-            # Create the folder name using only repo name and path
-            folder_components = [repo]
-            if folder_path:
-                # Clean folder path and add it to components
-                clean_folder_path = folder_path.strip('/').replace('/', '_')
-                if clean_folder_path:
-                    folder_components.append(clean_folder_path)
-            
-            # Use base_dir directly as it's already set to input_files
-            output_dir = Path(base_dir) / '_'.join(folder_components)
-            output_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Create full file path maintaining directory structure
-            relative_path_parts = relative_path.split('/')
-            if len(relative_path_parts) > 1:
-                # Create subdirectories if needed
-                sub_dir = output_dir / '/'.join(relative_path_parts[:-1])
-                sub_dir.mkdir(parents=True, exist_ok=True)
-            
-            output_path = output_dir / relative_path
-            
-            # Ensure the parent directory exists
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Download and save the file
-            try:
-                content = base64.b64decode(file_content.content)
-                with open(output_path, 'wb') as f:
-                    f.write(content)
-                return str(output_path)
-            except Exception as e:
-                raise Exception(f"Error writing file {output_path}: {str(e)}")
-                
-        except Exception as e:
-            raise Exception(f"Error downloading file {file_content.path}: {str(e)}")
+            with open(Path(base_dir) / SHA_CACHE_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_sha_cache(base_dir: str, sha_cache: dict):
+        Path(base_dir).mkdir(parents=True, exist_ok=True)
+        with open(Path(base_dir) / SHA_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(sha_cache, f)
+
+    @staticmethod
+    def _is_up_to_date(dest: Path, sha: str, sha_cache: dict) -> bool:
+        """Check whether dest already holds the blob with the given sha.
+        
+        The cached sha is trusted while the file's mtime is unchanged; otherwise
+        the file is hashed and the cache entry refreshed.
+        """
+        try:
+            mtime_ns = dest.stat().st_mtime_ns
+        except OSError:
+            return False
+        
+        cached = sha_cache.get(dest.as_posix())
+        if cached and cached['mtime_ns'] == mtime_ns:
+            return cached['sha'] == sha
+        
+        local_sha = git_file_sha(dest)
+        sha_cache[dest.as_posix()] = {'sha': local_sha, 'mtime_ns': mtime_ns}
+        return local_sha == sha
+
+    def _client_session(self) -> aiohttp.ClientSession:
+        """Create an HTTP session for raw file downloads, authenticated when a token is set."""
+        headers = {"Authorization": f"token {self.token}"} if self.token else {}
+        connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT_DOWNLOADS)
+        return aiohttp.ClientSession(headers=headers, connector=connector)
 
-    def upload_file(self, local_path: str, repo_url: str, branch: str, target_path: str) -> bool:
-        """Upload file to GitHub repository."""
+    async def _download_one(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                            file, dest: Path, sha_cache: dict) -> str:
+        """Download a single file's raw bytes to dest, backing off on 429 responses.
+        
+        Files whose local copy already matches the repository blob are skipped.
+        dest's parent directory must already exist (see prepare_download_tree).
+        """
         try:
-            owner, repo_name = self.parse_github_url(repo_url)[:2]
-            repo = self.github.get_repo(f"{owner}/{repo_name}")
+            if self._is_up_to_date(dest, file['sha'], sha_cache):
+                return str(dest)
             
-            file_info = {
-                'path': local_path,
-                'name': os.path.basename(local_path)
-            }
+            if not file['download_url']:
+                # Contents API entries without a raw URL carry their bytes inline
+                data = base64.b64decode(file['content'])
+                dest.write_bytes(data)
+                sha_cache[dest.as_posix()] = {'sha': git_blob_sha(data), 'mtime_ns': dest.stat().st_mtime_ns}
+                return str(dest)
             
-            commit_message = f"Add translated file: {file_info['name']}"
+            async with semaphore:
+                for attempt in range(MAX_DOWNLOAD_RETRIES):
+                    async with session.get(file['download_url']) as response:
+                        if response.status == 429 and attempt < MAX_DOWNLOAD_RETRIES - 1:
+                            retry_after = response.headers.get("Retry-After")
+                            await asyncio.sleep(float(retry_after) if retry_after else 2 ** attempt)
+                            continue
+                        response.raise_for_status()
+                        
+                        # Stream to disk so memory use doesn't grow with file size
+                        with open(dest, 'wb') as f:
+                            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                                f.write(chunk)
+                        break
             
-            return self.upload_to_github(repo, file_info, target_path, branch, commit_message)
+            # Record what actually landed on disk rather than the listed sha, so a
+            # truncated or altered download is fetched again next time
+            sha_cache[dest.as_posix()] = {'sha': git_file_sha(dest), 'mtime_ns': dest.stat().st_mtime_ns}
+            return str(dest)
         
         except Exception as e:
-            raise Exception(f"Error uploading file {local_path}: {str(e)}")
+            raise Exception(f"Error downloading file {file['path']}: {str(e)}")
+
+    async def download_files_async(self, files: list, base_dir: str, folder: str, folder_path: str = "",
+                                   on_complete: Optional[Callable[[dict, str], None]] = None) -> list:
+        """Download files concurrently into base_dir/folder (see local_path).
+        
+        on_complete(file, local_path) is called as each download finishes, e.g. to
+        advance a progress bar. Returns the local paths in the same order as files.
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        self.prepare_download_tree(files, base_dir, folder, folder_path)
+        sha_cache = self._load_sha_cache(base_dir)
+        
+        async def download(session, file):
+            local_path = await self._download_one(
+                session, semaphore, file, self.local_path(file, base_dir, folder, folder_path), sha_cache
+            )
+            if on_complete:
+                on_complete(file, local_path)
+            return local_path
+        
+        try:
+            async with self._client_session() as session:
+                async with asyncio.TaskGroup() as tg:
+                    tasks = [tg.create_task(download(session, file)) for file in files]
+        except ExceptionGroup as eg:
+            # Surface the first failure instead of the opaque group message
+            raise eg.exceptions[0] from None
+        finally:
+            self._save_sha_cache(base_dir, sha_cache)
+        
+        return [task.result() for task in tasks]
 
-    def upload_to_github(self, repo, file_info: dict, target_path: str, branch: str, commit_message: str):
-        """Upload a file to GitHub repository.
+    @staticmethod
+    def _create_blob(repo, content):
+        """Create a blob, retrying rate-limited and transient server errors with jittered backoff."""
+        if isinstance(content, str):
+            data, encoding = content, 'utf-8'
+        elif isinstance(content, Path):
+            data, encoding = file_base64(content), 'base64'
+        else:
+            data, encoding = base64.b64encode(content).decode('ascii'), 'base64'
+        
+        for attempt in range(MAX_UPLOAD_RETRIES):
+            try:
+                return repo.create_git_blob(data, encoding)
+            except GithubException as e:
+                if e.status not in RETRYABLE_STATUSES or attempt == MAX_UPLOAD_RETRIES - 1:
+                    raise
+                time.sleep(min(2 ** attempt, 30) + random.random())
+
+    def commit_files(self, repo, files: dict, branch: str, commit_message: str,
+                     on_progress: Optional[Callable[[int, str], None]] = None) -> str:
+        """Commit several files to branch as one commit through the Git Data API.
+        
         Args:
             repo: GitHub repository object
-            file_info: Dictionary containing file information ('path' and 'name')
-            target_path: Target path in the repository
-            branch: Repository branch
-            commit_message: Commit message
+            files: Repository path -> content: str, raw bytes, or a Path to read
+                and send as base64
+            branch: Branch to advance
+            commit_message: Message for the single commit
+            on_progress: Called as on_progress(done, path) as each blob is created
+        
+        Returns:
+            The sha of the new commit, or of the branch head if nothing changed
         """
-        try:
-            # Read file content with UTF-8 encoding
-            with open(file_info['path'], 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Get just the filename from the full path
-            file_name = os.path.basename(file_info['path'])
-            
-            # Create the target path in the repository
-            if target_path:
-                # If target_path is the last folder in the local path, use it directly
-                local_folder = os.path.basename(os.path.dirname(file_info['path']))
-                if local_folder == target_path:
-                    repo_file_path = os.path.join(target_path, file_name)
-                else:
-                    # Otherwise, use the target_path as provided
-                    repo_file_path = os.path.join(target_path, file_name)
+        ref = repo.get_git_ref(f"heads/{branch}")
+        base_commit = repo.get_git_commit(ref.object.sha)
+        
+        # Blob ids are content hashes, so content the branch already holds (or that
+        # repeats within this batch) can be referenced by sha without uploading it
+        base_tree = repo.get_git_tree(base_commit.tree.sha, recursive=True)
+        existing = {element.path: element.sha for element in base_tree.tree if element.type == 'blob'}
+        known_shas = set(existing.values())
+        
+        blob_shas = {}
+        pending = {}  # blob sha -> (content, paths using it)
+        for path, content in files.items():
+            if isinstance(content, Path):
+                sha = git_file_sha(content)
             else:
-                repo_file_path = file_name
-            
-            # Normalize path separators
-            repo_file_path = repo_file_path.replace('\\', '/')
-            
-            try:
-                # Check if file exists
-                contents = repo.get_contents(repo_file_path, ref=branch)
-                repo.update_file(
-                    contents.path,
-                    commit_message,
-                    content,
-                    contents.sha,
-                    branch=branch
-                )
-            except GithubException:
-                # File doesn't exist, create it
-                repo.create_file(
-                    repo_file_path,
-                    commit_message,
-                    content,
-                    branch=branch
-                )
-            
-            return True
-        except Exception as e:
-            raise Exception(f"Error uploading {file_info['name']}: {str(e)}")
+                sha = git_blob_sha(content.encode('utf-8') if isinstance(content, str) else content)
+            blob_shas[path] = sha
+            if sha not in known_shas:
+                pending.setdefault(sha, (content, []))[1].append(path)
+        
+        done = 0
+        if on_progress:
+            for path, sha in blob_shas.items():
+                if sha not in pending:
+                    done += 1
+                    on_progress(done, path)
+        
+        # Blob uploads are independent HTTP requests, so run them in parallel
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_UPLOADS) as executor:
+            futures = {
+                executor.submit(self._create_blob, repo, content): paths
+                for content, paths in pending.values()
+            }
+            for future in as_completed(futures):
+                future.result()
+                for path in futures[future]:
+                    done += 1
+                    if on_progress:
+                        on_progress(done, path)
+        
+        # Files whose content is unchanged at the same path don't need a tree entry
+        elements = [
+            InputGitTreeElement(path, '100644', 'blob', sha=sha)
+            for path, sha in blob_shas.items()
+            if existing.get(path) != sha
+        ]
+        if not elements:
+            return base_commit.sha
+        tree = repo.create_git_tree(elements, base_tree=base_commit.tree)
+        commit = repo.create_git_commit(commit_message, tree, [base_commit])
+        ref.edit(commit.sha)
+        return commit.sha
+
+
+def get_github_service(token: str = "") -> GitHubService:
+    """Return a GitHubService shared across reruns for the given token."""
+    token = token or ""
+    return _cached_github_service(hashlib.sha256(token.encode()).hexdigest(), token)
+
+
+@st.cache_resource(show_spinner=False)
+def _cached_github_service(token_hash: str, _token: str) -> GitHubService:
+    """Build one GitHubService per token, keyed by its hash rather than the raw token."""
+    return GitHubService(_token or None)
+
+
+def cached_list_files(token: str, repo_url: str, branch: str, folder_path: str = "", file_path: str = "", file_types: tuple = None) -> list:
+    """List repository files, reusing the result across reruns for ten minutes."""
+    token = token or ""
+    return _cached_list_files(
+        hashlib.sha256(token.encode()).hexdigest(), repo_url, branch, folder_path, file_path, file_types, token
+    )
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _cached_list_files(token_hash: str, repo_url: str, branch: str, folder_path: str, file_path: str,
+                       file_types: tuple, _token: str) -> list:
+    """Cached listing, keyed by the token's hash rather than the raw token."""
+    return get_github_service(_token).get_repository_files(
+        repo_url=repo_url,
+        branch=branch,
+        folder_path=folder_path,
+        file_path=file_path,
+        file_types=file_types
+    )
@@ -1,14 +1,31 @@
+import hashlib
+from functools import lru_cache
 from typing import Dict, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_cohere import ChatCohere
-from langchain_groq import ChatGroq
-from langchain_together import ChatTogether
+import streamlit as st
 
 class LLMFactory:
     @staticmethod
-    def create_llm(provider: str, api_key: str, model_name: Optional[str] = None, **kwargs):
-        """Create and return an LLM instance based on the provider."""
+    def create_llm(provider: str, api_key: str, model_name: Optional[str] = None, cached: bool = True, **kwargs):
+        """Return an LLM instance for the provider, reused across Streamlit reruns.
+        
+        Pass cached=False for a client used inside asyncio.run: a client's async HTTP
+        pool stays bound to the event loop it first ran on, and every asyncio.run
+        starts a new one.
+        """
+        if not cached:
+            return LLMFactory._build_llm(provider, api_key, model_name, **kwargs)
+        api_key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+        return _cached_llm(provider, api_key_hash, model_name, tuple(sorted(kwargs.items())), api_key)
+
+    @staticmethod
+    def _build_llm(provider: str, api_key: str, model_name: Optional[str] = None, **kwargs):
+        """Create and return an LLM instance based on the provider.
+        
+        Provider SDKs are imported here, on first use, so importing this module
+        (e.g. for get_available_models) doesn't load all of them.
+        """
         if provider == "gemini":
+            from langchain_google_genai import ChatGoogleGenerativeAI
             return ChatGoogleGenerativeAI(
                 model="gemini-1.5-pro",
                 google_api_key=api_key,
@@ -16,6 +33,7 @@ class LLMFactory:
                 **kwargs
             )
         elif provider == "cohere":
+            from langchain_cohere import ChatCohere
             return ChatCohere(
                 model=model_name or "command-r-plus-08-2024",
                 cohere_api_key=api_key,
@@ -23,6 +41,7 @@ class LLMFactory:
                 **kwargs
             )
         elif provider == "groq":
+            from langchain_groq import ChatGroq
             return ChatGroq(
                 model_name=model_name or "llama-3.3-70b-versatile",
                 api_key=api_key,
@@ -30,6 +49,7 @@ class LLMFactory:
                 **kwargs
             )
         elif provider == "together":
+            from langchain_together import ChatTogether
             return ChatTogether(
                 model=model_name or "mistralai/Mixtral-8x7B-Instruct-v0.1",
                 together_api_key=api_key,
@@ -40,6 +60,7 @@ class LLMFactory:
             raise ValueError(f"Unsupported LLM provider: {provider}")
     
     @staticmethod
+    @lru_cache(maxsize=1)
     def get_available_models() -> Dict[str, list]:
         """Return available models for each provider."""
         return {
@@ -51,3 +72,13 @@ class LLMFactory:
                 "meta-llama/Llama-2-70b-chat-hf"
             ]
         }
+
+
+@st.cache_resource(show_spinner=False)
+def _cached_llm(provider: str, api_key_hash: str, model_name: Optional[str], kwargs_items: tuple, _api_key: str):
+    """Build one client per (provider, key, model, kwargs).
+    
+    The raw key is passed as an underscore argument so Streamlit leaves it out of
+    the cache key; api_key_hash identifies it instead.
+    """
+    return LLMFactory._build_llm(provider, _api_key, model_name, **dict(kwargs_items))
@@ -1,13 +1,20 @@
 import streamlit as st
 import os
-from pathlib import Path
-import yaml
-import shutil
+import asyncio
+from dataclasses import dataclass, field
+from typing import Set
+import pandas as pd
+from itertools import groupby
+from operator import itemgetter
 from dotenv import load_dotenv
 
-from config import AppConfig
-from translation_service import TranslationService
+from config import AppConfig, get_config
+from translation_service import TranslationService, MAX_CONCURRENT_TRANSLATIONS
 from llm_factory import LLMFactory
+from ui_utils import (
+    throttled_progress, remember_translation, parse_glossary_bytes, dir_mtime_key, scan_files, is_empty_dir,
+    reset_editor, keep_selection
+)
 
 # Load environment variables
 load_dotenv()
@@ -38,38 +45,60 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+@dataclass
+class UIState:
+    """Selection state for the page, kept under one session_state key instead of one per widget.
+
+    selected is the base selection the tables are built from (see ui_utils.reset_editor).
+    """
+    selected: Set[str] = field(default_factory=set)
+
 def initialize_session_state():
     """Initialize session state variables."""
     if 'base_input_dir' not in st.session_state:
         st.session_state.base_input_dir = "input_files"
     if 'base_output_dir' not in st.session_state:
         st.session_state.base_output_dir = "output_files"
+    if 'translated_contents' not in st.session_state:
+        st.session_state.translated_contents = {}
+    if 'ui' not in st.session_state:
+        st.session_state.ui = UIState()
 
-def get_downloaded_files():
-    """Get all downloaded files from input directory."""
-    input_dir = Path(st.session_state.base_input_dir)
-    if not input_dir.exists():
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def _list_downloaded_files(input_dir: str, mtime_key) -> list:
+    """Walk input_dir; mtime_key is only part of the cache key."""
+    if mtime_key is None:
         return []
     
+    # scandir paths are input_dir joined with the entry names, so slicing gives the relative name
+    prefix_len = len(os.path.join(input_dir, ''))
     files = []
-    for repo_dir in input_dir.iterdir():
-        if repo_dir.is_dir():
-            for file_path in repo_dir.rglob("*"):
-                if file_path.is_file() and file_path.suffix.lower() in AppConfig.supported_file_types:
+    with os.scandir(input_dir) as repo_dirs:
+        for repo_dir in repo_dirs:
+            if repo_dir.is_dir():
+                for entry in scan_files(repo_dir.path):
                     files.append({
-                        'path': str(file_path),
-                        'name': str(file_path.relative_to(input_dir)),
+                        'path': entry.path,
+                        'name': entry.path[prefix_len:],
                         'repo': repo_dir.name,
-                        'type': file_path.suffix.lower()
+                        'type': os.path.splitext(entry.name)[1].lower()
                     })
     return files
 
+def get_downloaded_files():
+    """Get all downloaded files from input directory."""
+    input_dir = st.session_state.base_input_dir
+    return _list_downloaded_files(input_dir, dir_mtime_key(input_dir))
+
 def delete_file(file_path: str):
-    """Delete a file and its empty parent directories."""
+    """Delete a file and its empty parent directories, up to the base directory."""
     try:
         os.remove(file_path)
-        parent = os.path.dirname(file_path)
-        while parent and not os.listdir(parent):
+        _list_downloaded_files.clear()
+        st.session_state.ui.selected.discard(file_path)
+        root = os.path.normpath(st.session_state.base_input_dir)
+        parent = os.path.dirname(os.path.normpath(file_path))
+        while parent and parent != root and is_empty_dir(parent):
             os.rmdir(parent)
             parent = os.path.dirname(parent)
         return True
@@ -77,6 +106,43 @@ def delete_file(file_path: str):
         st.error(f"Error deleting file: {str(e)}")
         return False
 
+async def _translation_worker(queue: asyncio.Queue, results: asyncio.Queue, translation_service: TranslationService,
+                              base_output_dir: str, translation_folder: str):
+    """Translate files from queue until it is empty, putting (file_info, output_path, content, error) on results."""
+    while True:
+        try:
+            file_info = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        try:
+            output_path, content = await translation_service.process_file_async(
+                file_info['path'],
+                base_output_dir,
+                translation_folder
+            )
+            await results.put((file_info, output_path, content, None))
+        except Exception as e:
+            await results.put((file_info, None, None, e))
+
+async def translate_files(translation_service: TranslationService, selected_files: list,
+                          base_output_dir: str, translation_folder: str, on_result):
+    """Translate files with a fixed pool of workers, calling on_result(done, file_info, output_path,
+    content, error) from this coroutine as each one finishes."""
+    queue = asyncio.Queue()
+    for file_info in selected_files:
+        queue.put_nowait(file_info)
+    results = asyncio.Queue()
+    
+    workers = [
+        asyncio.create_task(_translation_worker(
+            queue, results, translation_service, base_output_dir, translation_folder
+        ))
+        for _ in range(min(MAX_CONCURRENT_TRANSLATIONS, len(selected_files)))
+    ]
+    for done in range(1, len(selected_files) + 1):
+        on_result(done, *await results.get())
+    await asyncio.gather(*workers)
+
 def main():
     initialize_session_state()
     
@@ -102,7 +168,7 @@ def main():
         api_key = st.text_input(
             f"{llm_provider.title()} API Key",
             type="password",
-            value=os.getenv(f"{llm_provider.upper()}_API_KEY", "")
+            value=get_config().api_keys.get(llm_provider, "")
         )
         
         # Available models for selected provider
@@ -122,37 +188,58 @@ def main():
         st.warning("No files found in input directory. Please download some files first.")
         return
     
-    # Group files by repository folder
-    repos = {}
-    for file in files:
-        if file['repo'] not in repos:
-            repos[file['repo']] = []
-        repos[file['repo']].append(file)
+    # Group files by repository folder; sorting keeps table rows in a stable order
+    files.sort(key=itemgetter('repo', 'path'))
+    repos = {repo: list(group) for repo, group in groupby(files, key=itemgetter('repo'))}
     
     # Display files by repository in expandable sections
     for repo_name, repo_files in repos.items():
         with st.expander(f"📁 {repo_name} ({len(repo_files)} files)", expanded=True):
-            # Select all for this repo
-            col1, col2 = st.columns([1, 4])
+            ui = st.session_state.ui
+            
+            # Select All / Deselect All for this repo; they reset any pending edits in the table
+            col1, col2, col3 = st.columns([1, 1, 3])
             with col1:
-                select_all = st.checkbox(f"Select All", key=f"select_all_{repo_name}")
+                if st.button("Select All", key=f"select_all_{repo_name}"):
+                    ui.selected.update(file['path'] for file in repo_files)
+                    reset_editor(f"editor_{repo_name}")
+                    st.rerun()
+            with col2:
+                if st.button("Deselect All", key=f"deselect_all_{repo_name}"):
+                    ui.selected.difference_update(file['path'] for file in repo_files)
+                    reset_editor(f"editor_{repo_name}")
+                    st.rerun()
+            
+            # One table widget per repo instead of a checkbox and delete button per file
+            files_df = pd.DataFrame({
+                'select': [file['path'] in ui.selected for file in repo_files],
+                'file': [os.path.basename(file['path']) for file in repo_files],
+                'path': [file['path'] for file in repo_files],
+                'delete': False
+            })
+            edited_files = st.data_editor(
+                files_df,
+                column_config={
+                    "select": st.column_config.CheckboxColumn("Select"),
+                    "file": st.column_config.TextColumn("📄 File"),
+                    "path": st.column_config.TextColumn("Local Path"),
+                    "delete": st.column_config.CheckboxColumn("🗑️ Delete")
+                },
+                disabled=["file", "path"],
+                hide_index=True,
+                use_container_width=True,
+                key=f"editor_{repo_name}"
+            )
+            selected_files = [file for file, selected in zip(repo_files, edited_files['select']) if selected]
+            marked_files = [file for file, marked in zip(repo_files, edited_files['delete']) if marked]
             
-            # File selection
-            selected_files = []
-            for file in repo_files:
-                col1, col2, col3 = st.columns([3, 1, 1])
-                with col1:
-                    selected = st.checkbox(
-                        "📄 " + os.path.basename(file['path']),
-                        value=select_all,
-                        key=f"file_{file['path']}"
-                    )
-                    if selected:
-                        selected_files.append(file)
-                with col2:
-                    if st.button("🗑️", key=f"delete_{file['path']}", help="Delete file"):
-                        if delete_file(file['path']):
-                            st.rerun()
+            if marked_files and st.button(f"🗑️ Delete Marked Files ({len(marked_files)})", key=f"delete_{repo_name}"):
+                for file in marked_files:
+                    delete_file(file['path'])
+                # The editor is reset, so carry the current selection over
+                keep_selection(ui.selected, repo_files, selected_files)
+                reset_editor(f"editor_{repo_name}")
+                st.rerun()
             
             # Translation button for this repo
             if selected_files:
@@ -160,18 +247,19 @@ def main():
                 if st.button(f"Translate Selected Files ({len(selected_files)})", key=f"translate_{repo_name}"):
                     try:
                         with st.spinner("Setting up translation service..."):
-                            # Create LLM instance
+                            # Create LLM instance; translation runs on a new event loop,
+                            # so it can't reuse the cached client
                             llm = LLMFactory.create_llm(
                                 llm_provider,
                                 api_key,
-                                model_name=model_name
+                                model_name=model_name,
+                                cached=False
                             )
                             
                             # Load glossary if provided
                             glossary = {}
                             if glossary_file:
-                                glossary_content = glossary_file.read().decode()
-                                glossary = yaml.safe_load(glossary_content)
+                                glossary = parse_glossary_bytes(glossary_file.getvalue())
                             
                             translation_service = TranslationService(llm, glossary)
                         
@@ -179,34 +267,38 @@ def main():
                         files_progress = st.empty()
                         current_file = st.empty()
                         progress_bar = st.progress(0)
+                        tick = throttled_progress(progress_bar, current_file)
                         
-                        # Process files
-                        total_files = len(selected_files)
-                        for i, file_info in enumerate(selected_files, 1):
-                            current_file.text(f"Processing: {file_info['name']}")
-                            
-                            try:
-                                # Translate file
-                                output_path = translation_service.process_file(
-                                    file_info['path'],
-                                    st.session_state.base_output_dir,
-                                    repo_name
-                                )
+                        def on_result(done: int, file_info: dict, output_path, content, error):
+                            if error is None:
                                 files_progress.success(
                                     f"✅ Translated: {file_info['name']} → {output_path}"
                                 )
+                                remember_translation(output_path, content)
                                 
                                 # Delete input file after successful translation
                                 delete_file(file_info['path'])
-                                
-                            except Exception as e:
+                            else:
                                 files_progress.error(
-                                    f"❌ Error processing {file_info['name']}: {str(e)}"
+                                    f"❌ Error processing {file_info['name']}: {str(error)}"
                                 )
                             
                             # Update progress
-                            progress_bar.progress(i / total_files)
+                            tick(done, len(selected_files), f"Finished: {file_info['name']}")
+                        
+                        # Process files, several at a time
+                        current_file.text(f"Processing {len(selected_files)} files...")
+                        asyncio.run(translate_files(
+                            translation_service,
+                            selected_files,
+                            st.session_state.base_output_dir,
+                            repo_name,
+                            on_result
+                        ))
                         
+                        # Rows changed, so drop edits that refer to the old row positions
+                        keep_selection(ui.selected, repo_files, selected_files)
+                        reset_editor(f"editor_{repo_name}")
                         st.success(f"Translation completed! Check {st.session_state.base_output_dir}/{repo_name} for translated files.")
                         st.rerun()
                         
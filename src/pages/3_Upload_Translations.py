@@ -1,9 +1,15 @@
 import streamlit as st
 import os
+import pandas as pd
 from pathlib import Path
-from github import Github, GithubException
+from itertools import groupby
+from operator import itemgetter
+from typing import Optional, Tuple, Union
+from github import GithubException
 from dotenv import load_dotenv
-from config import AppConfig
+from config import AppConfig, get_config
+from github_service import get_github_service, parse_github_url
+from ui_utils import throttled_progress, dir_mtime_key, scan_files, is_empty_dir, reset_editor, keep_selection
 
 # Load environment variables
 load_dotenv()
@@ -18,32 +24,60 @@ def initialize_session_state():
     """Initialize session state variables."""
     if 'base_output_dir' not in st.session_state:
         st.session_state.base_output_dir = "output_files"
+    if 'translated_contents' not in st.session_state:
+        st.session_state.translated_contents = {}
+    # Base selection the tables are built from (see ui_utils.reset_editor)
+    if 'upload_selected' not in st.session_state:
+        st.session_state.upload_selected = set()
 
-def get_translated_files():
-    """Get all translated files from output directory."""
-    output_dir = Path(st.session_state.base_output_dir)
-    if not output_dir.exists():
+def remembered_translation(file_path: str) -> Optional[str]:
+    """Return the in-memory translation for file_path if the file hasn't changed since."""
+    entry = st.session_state.translated_contents.get(file_path)
+    if entry is None:
+        return None
+    mtime_ns, content = entry
+    try:
+        if os.stat(file_path).st_mtime_ns == mtime_ns:
+            return content
+    except OSError:
+        pass
+    return None
+
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def _list_translated_files(output_dir: str, mtime_key) -> list:
+    """Walk output_dir; mtime_key is only part of the cache key."""
+    if mtime_key is None:
         return []
     
     files = []
-    for repo_dir in output_dir.iterdir():
-        if repo_dir.is_dir():
-            for file_path in repo_dir.rglob("*"):
-                if file_path.is_file() and file_path.suffix.lower() in AppConfig.supported_file_types:
+    with os.scandir(output_dir) as repo_dirs:
+        for repo_dir in repo_dirs:
+            if repo_dir.is_dir():
+                # scandir paths start with the repo folder, so slicing gives the path inside it
+                prefix_len = len(os.path.join(repo_dir.path, ''))
+                for entry in scan_files(repo_dir.path):
                     files.append({
-                        'path': str(file_path),
-                        'name': file_path.name,
+                        'path': entry.path,
+                        'name': entry.name,
+                        'rel_path': entry.path[prefix_len:].replace(os.sep, '/'),
                         'repo': repo_dir.name,
-                        'type': file_path.suffix.lower()
+                        'type': os.path.splitext(entry.name)[1].lower()
                     })
     return files
 
+def get_translated_files():
+    """Get all translated files from output directory."""
+    output_dir = st.session_state.base_output_dir
+    return _list_translated_files(output_dir, dir_mtime_key(output_dir))
+
 def delete_file(file_path: str):
-    """Delete a file and its empty parent directories."""
+    """Delete a file and its empty parent directories, up to the base directory."""
     try:
         os.remove(file_path)
-        parent = os.path.dirname(file_path)
-        while parent and not os.listdir(parent):
+        _list_translated_files.clear()
+        root = os.path.normpath(st.session_state.base_output_dir)
+        parent = os.path.dirname(os.path.normpath(file_path))
+        while parent and parent != root and is_empty_dir(parent):
             os.rmdir(parent)
             parent = os.path.dirname(parent)
         return True
@@ -51,66 +85,18 @@ def delete_file(file_path: str):
         st.error(f"Error deleting file: {str(e)}")
         return False
 
-def upload_to_github(repo, file_info: dict, target_path: str, branch: str) -> bool:
-    """Upload a file to GitHub repository."""
-    try:
-        # Read file content based on file type
-        file_path = Path(file_info['path'])
-        is_binary = file_path.suffix.lower() in ['.ipynb']  # Add other binary file types if needed
-        
-        if is_binary:
-            with open(file_path, 'rb') as f:
-                content = f.read()
-        else:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        
-        # Get just the filename from the full path
-        file_name = os.path.basename(file_info['path'])
-        
-        # Create the target path in the repository
-        if target_path:
-            repo_file_path = f"{target_path}/{file_name}"
-        else:
-            repo_file_path = file_name
-        
-        # Remove any leading/trailing slashes
-        repo_file_path = repo_file_path.strip('/')
-        
-        # Create commit message
-        commit_message = f"Add translated file: {file_name}"
-        
-        try:
-            # Check if file exists
-            try:
-                contents = repo.get_contents(repo_file_path, ref=branch)
-                repo.update_file(
-                    contents.path,
-                    commit_message,
-                    content,
-                    contents.sha,
-                    branch=branch
-                )
-            except GithubException:
-                # File doesn't exist, create it
-                repo.create_file(
-                    repo_file_path,
-                    commit_message,
-                    content,
-                    branch=branch
-                )
-            
-            return True
-            
-        except GithubException as e:
-            st.error(f"GitHub API Error: {str(e)}")
-            if hasattr(e, 'data') and 'message' in e.data:
-                st.error(f"GitHub says: {e.data['message']}")
-            return False
-            
-    except Exception as e:
-        st.error(f"Error uploading file: {str(e)}")
-        return False
+def prepare_upload(file_info: dict, target_path: str, content: Optional[str] = None) -> Tuple[str, Union[str, Path]]:
+    """Return the repository path and content to commit for a translated file.
+    
+    When content is given it is used as-is; otherwise the file's Path is returned and
+    GitHubService.commit_files reads it in chunks.
+    """
+    # Files are streamed up as base64 at commit time rather than read here
+    if content is None:
+        content = Path(file_info['path'])
+    
+    # Keep the file's place inside its repo folder, so files sharing a name don't collide
+    return f"{target_path}/{file_info['rel_path']}".strip('/'), content
 
 def main():
     initialize_session_state()
@@ -127,7 +113,7 @@ def main():
     github_token = st.text_input(
         "GitHub Token (required)",
         type="password",
-        value=os.getenv("GITHUB_TOKEN", ""),
+        value=get_config().github_token,
         help="Required for uploading files"
     )
     
@@ -135,144 +121,179 @@ def main():
         st.error("GitHub token is required for uploading files.")
         return
     
-    # URL input
-    repo_url = st.text_input(
-        "Target GitHub URL",
-        placeholder="https://github.com/owner/repo/tree/branch/path",
-        help="Enter the GitHub URL where you want to upload the translations"
-    )
+    # URL and options live in a form so typing doesn't rerun the page on every keystroke
+    with st.form("upload_form", clear_on_submit=False):
+        # URL input
+        repo_url = st.text_input(
+            "Target GitHub URL",
+            placeholder="https://github.com/owner/repo/tree/branch/path",
+            help="Enter the GitHub URL where you want to upload the translations"
+        )
+        
+        # Delete after upload option
+        delete_after_upload = st.checkbox("Delete files after successful upload", value=True)
+        submitted = st.form_submit_button("Parse")
     
-    # Delete after upload option
-    delete_after_upload = st.checkbox("Delete files after successful upload", value=True)
+    # Parse only on submit; the result is kept so it survives the upload buttons' reruns
+    if submitted:
+        st.session_state.pop('upload_target', None)
+        if repo_url:
+            try:
+                st.session_state.upload_target = parse_github_url(repo_url)
+            except ValueError as e:
+                st.error(str(e))
     
-    if repo_url:
-        try:
-            # Clean up the repository URL
-            if 'github.com' in repo_url:
-                repo_url = repo_url.split('github.com/')[-1]
-            repo_url = repo_url.strip('/')
-            
-            # Parse URL components
-            parts = repo_url.split('/')
-            if len(parts) < 2:
-                st.error("Invalid GitHub URL. Must contain owner and repository name.")
-                return
-            
-            owner = parts[0]
-            repo_name = parts[1]
-            
-            # Handle tree/blob paths
-            if len(parts) > 2 and parts[2] in ['tree', 'blob']:
-                branch = parts[3]
-                folder_path = '/'.join(parts[4:]) if len(parts) > 4 else ""
-            else:
-                branch = "main"
-                folder_path = '/'.join(parts[2:]) if len(parts) > 2 else ""
-            
-            # Show extracted information
-            col1, col2 = st.columns(2)
-            with col1:
-                st.info(f"📦 Repository: {owner}/{repo_name}")
-                st.info(f"🌿 Branch: {branch}")
-            with col2:
-                st.info(f"📁 Upload Path: {'/' + folder_path if folder_path else 'Root'}")
-            
-            # Get translated files
-            files = get_translated_files()
-            
-            if not files:
-                st.warning("No translated files found in output directory.")
-                return
-            
-            # Group files by repository folder
-            repos = {}
-            for file in files:
-                if file['repo'] not in repos:
-                    repos[file['repo']] = []
-                repos[file['repo']].append(file)
-            
-            # Display files by repository in expandable sections
-            for repo_folder, repo_files in repos.items():
-                with st.expander(f"📁 {repo_folder} ({len(repo_files)} files)", expanded=True):
-                    # Select all for this repo
-                    col1, col2 = st.columns([1, 4])
-                    with col1:
-                        select_all = st.checkbox(f"Select All", key=f"select_all_{repo_folder}")
-                    
-                    # File selection
-                    selected_files = []
-                    for file in repo_files:
-                        col1, col2 = st.columns([4, 1])
-                        with col1:
-                            selected = st.checkbox(
-                                "📄 " + os.path.basename(file['path']),
-                                value=select_all,
-                                key=f"file_{file['path']}"
-                            )
-                            if selected:
-                                selected_files.append(file)
-                        with col2:
-                            if st.button("🗑️", key=f"delete_{file['path']}", help="Delete file"):
-                                if delete_file(file['path']):
-                                    st.rerun()
-                    
-                    # Upload button for this repo
-                    if selected_files:
-                        st.markdown("---")
-                        if st.button(f"Upload Selected Files ({len(selected_files)})", key=f"upload_{repo_folder}"):
+    if 'upload_target' in st.session_state:
+        owner, repo_name, branch, folder_path = st.session_state.upload_target
+        
+        # Show extracted information
+        col1, col2 = st.columns(2)
+        with col1:
+            st.info(f"📦 Repository: {owner}/{repo_name}")
+            st.info(f"🌿 Branch: {branch}")
+        with col2:
+            st.info(f"📁 Upload Path: {'/' + folder_path if folder_path else 'Root'}")
+        
+        # Get translated files
+        files = get_translated_files()
+        
+        if not files:
+            st.warning("No translated files found in output directory.")
+            return
+        
+        # Group files by repository folder; sorting keeps table rows in a stable order
+        files.sort(key=itemgetter('repo', 'path'))
+        repos = {repo: list(group) for repo, group in groupby(files, key=itemgetter('repo'))}
+        
+        # Display files by repository in expandable sections
+        for repo_folder, repo_files in repos.items():
+            with st.expander(f"📁 {repo_folder} ({len(repo_files)} files)", expanded=True):
+                # Select All / Deselect All reset any pending edits in the table
+                col1, col2, col3 = st.columns([1, 1, 3])
+                with col1:
+                    if st.button("Select All", key=f"select_all_{repo_folder}"):
+                        st.session_state.upload_selected.update(file['path'] for file in repo_files)
+                        reset_editor(f"editor_{repo_folder}")
+                        st.rerun()
+                with col2:
+                    if st.button("Deselect All", key=f"deselect_all_{repo_folder}"):
+                        st.session_state.upload_selected.difference_update(file['path'] for file in repo_files)
+                        reset_editor(f"editor_{repo_folder}")
+                        st.rerun()
+                
+                # One table widget per repo instead of a checkbox and delete button per file
+                files_df = pd.DataFrame({
+                    'select': [file['path'] in st.session_state.upload_selected for file in repo_files],
+                    'file': [os.path.basename(file['path']) for file in repo_files],
+                    'path': [file['path'] for file in repo_files],
+                    'delete': False
+                })
+                edited_files = st.data_editor(
+                    files_df,
+                    column_config={
+                        "select": st.column_config.CheckboxColumn("Select"),
+                        "file": st.column_config.TextColumn("📄 File"),
+                        "path": st.column_config.TextColumn("Local Path"),
+                        "delete": st.column_config.CheckboxColumn("🗑️ Delete")
+                    },
+                    disabled=["file", "path"],
+                    hide_index=True,
+                    use_container_width=True,
+                    key=f"editor_{repo_folder}"
+                )
+                selected_files = [file for file, selected in zip(repo_files, edited_files['select']) if selected]
+                marked_files = [file for file, marked in zip(repo_files, edited_files['delete']) if marked]
+                
+                if marked_files and st.button(f"🗑️ Delete Marked Files ({len(marked_files)})", key=f"delete_{repo_folder}"):
+                    for file in marked_files:
+                        delete_file(file['path'])
+                    # The editor is reset, so carry the current selection over
+                    keep_selection(st.session_state.upload_selected, repo_files, selected_files)
+                    reset_editor(f"editor_{repo_folder}")
+                    st.rerun()
+                
+                # Upload button for this repo
+                if selected_files:
+                    st.markdown("---")
+                    if st.button(f"Upload Selected Files ({len(selected_files)})", key=f"upload_{repo_folder}"):
+                        try:
+                            # Initialize GitHub with explicit error handling
                             try:
-                                # Initialize GitHub with explicit error handling
+                                github_service = get_github_service(github_token)
+                                repo = github_service.github.get_repo(f"{owner}/{repo_name}")
+                            except Exception as e:
+                                st.error(f"Error accessing repository: {str(e)}")
+                                st.error(f"Please check if:\n1. Your GitHub token is valid\n2. You have access to {owner}/{repo_name}\n3. The repository exists and is spelled correctly")
+                                return
+                            
+                            # Create progress containers
+                            progress_text = st.empty()
+                            progress_bar = st.progress(0)
+                            tick = throttled_progress(progress_bar, progress_text)
+                            files_progress = st.container()
+                            
+                            # Collect every file so they all land in a single commit
+                            uploads = {}
+                            ready_files = []
+                            for file_info in selected_files:
                                 try:
-                                    g = Github(github_token)
-                                    repo = g.get_repo(f"{owner}/{repo_name}")
+                                    content = remembered_translation(file_info['path'])
+                                    repo_file_path, content = prepare_upload(file_info, folder_path, content)
                                 except Exception as e:
-                                    st.error(f"Error accessing repository: {str(e)}")
-                                    st.error(f"Please check if:\n1. Your GitHub token is valid\n2. You have access to {owner}/{repo_name}\n3. The repository exists and is spelled correctly")
-                                    return
-                                
-                                # Create progress containers
-                                progress_text = st.empty()
-                                progress_bar = st.progress(0)
-                                files_progress = st.container()
-                                
-                                # Upload files
-                                total_files = len(selected_files)
-                                successful_uploads = 0
-                                
-                                for i, file_info in enumerate(selected_files, 1):
-                                    progress_text.text(f"Uploading: {file_info['name']}")
-                                    
-                                    try:
-                                        if upload_to_github(repo, file_info, folder_path, branch):
-                                            with files_progress:
-                                                st.success(f"✅ Uploaded: {file_info['name']}")
-                                            successful_uploads += 1
-                                            
-                                            # Delete local file after successful upload if option is selected
-                                            if delete_after_upload:
-                                                delete_file(file_info['path'])
-                                    except Exception as e:
-                                        with files_progress:
-                                            st.error(f"❌ Failed to upload {file_info['name']}: {str(e)}")
-                                    
-                                    # Update progress
-                                    progress_bar.progress(i / total_files)
+                                    with files_progress:
+                                        st.error(f"❌ Failed to read {file_info['name']}: {str(e)}")
+                                    continue
                                 
+                                # One commit holds one version per path, so refuse rather than drop a file
+                                if repo_file_path in uploads:
+                                    st.error(f"❌ Several selected files would be uploaded to {repo_file_path}. Nothing was uploaded.")
+                                    return
+                                uploads[repo_file_path] = content
+                                ready_files.append(file_info)
+                            
+                            if not uploads:
+                                return
+                            
+                            total_files = len(uploads)
+                            if total_files == 1:
+                                commit_message = f"Add translated file: {os.path.basename(next(iter(uploads)))}"
+                            else:
+                                commit_message = f"Add {total_files} translated files"
+                            
+                            def on_progress(done: int, repo_file_path: str):
+                                tick(done, total_files, f"Uploading: {repo_file_path}")
+                            
+                            try:
+                                github_service.commit_files(repo, uploads, branch, commit_message, on_progress)
+                            except GithubException as e:
                                 progress_text.empty()
-                                if successful_uploads == total_files:
-                                    st.success(f"Successfully uploaded all {total_files} files!")
-                                else:
-                                    st.warning(f"Uploaded {successful_uploads} out of {total_files} files.")
+                                st.error(f"GitHub API Error: {str(e)}")
+                                if hasattr(e, 'data') and 'message' in e.data:
+                                    st.error(f"GitHub says: {e.data['message']}")
+                                return
+                            
+                            progress_text.empty()
+                            for file_info in ready_files:
+                                with files_progress:
+                                    st.success(f"✅ Uploaded: {file_info['name']}")
                                 
-                                if successful_uploads > 0:
-                                    st.rerun()
+                                # Delete local file after successful upload if option is selected
+                                if delete_after_upload:
+                                    delete_file(file_info['path'])
+                                    st.session_state.translated_contents.pop(file_info['path'], None)
                             
-                            except Exception as e:
-                                st.error(f"An error occurred: {str(e)}")
-                                st.error("Please check your GitHub token and repository permissions.")
-        
-        except ValueError as e:
-            st.error(str(e))
+                            if len(ready_files) == len(selected_files):
+                                st.success(f"Successfully uploaded all {len(ready_files)} files!")
+                            else:
+                                st.warning(f"Uploaded {len(ready_files)} out of {len(selected_files)} files.")
+                            # Rows changed, so drop edits that refer to the old row positions
+                            keep_selection(st.session_state.upload_selected, repo_files, selected_files)
+                            reset_editor(f"editor_{repo_folder}")
+                            st.rerun()
+                        
+                        except Exception as e:
+                            st.error(f"An error occurred: {str(e)}")
+                            st.error("Please check your GitHub token and repository permissions.")
 
 if __name__ == "__main__":
     main()
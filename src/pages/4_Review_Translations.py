@@ -1,34 +1,66 @@
 import streamlit as st
 import os
+import re
 import yaml
 from pathlib import Path
-
-def load_config():
-    with open("config.yaml", "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+from config import YamlLoader
+from ui_utils import dir_mtime_key
+
+@st.cache_data(show_spinner=False)
+def _parse_config(config_path, mtime):
+    # mtime is only part of the cache key, so edits to the file are picked up
+    with open(config_path, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=YamlLoader)
+
+def load_config(config_path="config.yaml"):
+    return _parse_config(config_path, os.path.getmtime(config_path))
+
+def _scan_supported(directory, exts, rel_prefix=""):
+    # DirEntry carries the file type from readdir, so no extra stat per entry.
+    # rel_prefix is this directory's path relative to the input directory (with a
+    # trailing separator), built once per directory instead of a relpath per file.
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan_supported(entry.path, exts, rel_prefix + entry.name + os.sep)
+            elif entry.is_file():
+                ext = os.path.splitext(entry.name)[1]
+                if ext.lower() in exts:
+                    yield rel_prefix + entry.name, entry.stat().st_size, ext
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _list_supported_files(directory, supported_types, mtime_key):
+    # mtime_key is only part of the cache key
+    exts = frozenset(ext.lower() for ext in supported_types)
+    # (path relative to the input directory, size in bytes, extension)
+    return sorted(_scan_supported(directory, exts))
 
 def get_supported_files(directory, supported_types):
-    files = []
-    for root, _, filenames in os.walk(directory):
-        for filename in filenames:
-            if any(filename.endswith(ext) for ext in supported_types):
-                # Get relative path from input directory
-                rel_path = os.path.relpath(os.path.join(root, filename), directory)
-                files.append(rel_path)
-    return sorted(files)
+    # Keyed on every directory's mtime, so files removed from nested folders by the
+    # other pages drop out right away
+    mtime_key = dir_mtime_key(directory)
+    if mtime_key is None:
+        return []
+    return _list_supported_files(directory, tuple(supported_types), mtime_key)
 
 def read_file(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return Path(file_path).read_text(encoding='utf-8')
     except Exception as e:
         st.error(f"خطأ في قراءة الملف: {str(e)}")
         return ""
 
+# Blank lines, including ones holding only whitespace or \r from Windows line endings
+_PARA_RE = re.compile(r'\n\s*\n')
+
 def split_into_paragraphs(text):
     # Split text into paragraphs (separated by one or more blank lines)
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-    return paragraphs
+    return [para for p in _PARA_RE.split(text) if (para := p.strip())]
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def source_paragraphs_for(file_path, mtime):
+    # mtime is only part of the cache key, so edits to the file are picked up
+    return split_into_paragraphs(read_file(file_path))
 
 st.set_page_config(
     page_title="مراجعة الترجمة",
@@ -43,6 +75,11 @@ if 'translated_paragraphs' not in st.session_state:
     st.session_state.translated_paragraphs = []
 if 'current_file' not in st.session_state:
     st.session_state.current_file = None
+if 'review_page' not in st.session_state:
+    st.session_state.review_page = 0
+
+# Paragraph pairs rendered per page, so each rerun only builds widgets for one page
+PARAGRAPHS_PER_PAGE = 20
 
 def add_paragraph_after(index):
     st.session_state.translated_paragraphs.insert(index + 1, "")
@@ -75,10 +112,12 @@ try:
         st.error(f"لا توجد ملفات مدعومة في مجلد المدخلات. الأنواع المدعومة: {', '.join(supported_types)}")
         st.info("يمكنك إضافة ملفات جديدة عن طريق صفحة 'رفع الملفات' 📤")
     else:
+        # Size and extension come from the cached listing rather than fresh stat calls
+        file_info = {rel_path: (size, ext) for rel_path, size, ext in input_files}
         selected_file = st.selectbox(
             "اختر الملف للمراجعة",
-            input_files,
-            format_func=lambda x: f"{x} ({os.path.splitext(x)[1]})"
+            list(file_info),
+            format_func=lambda x: f"{x} ({file_info[x][1]})"
         )
 
         if selected_file:
@@ -95,21 +134,20 @@ try:
             else:
                 translated_text = read_file(translated_path)
 
-            source_text = read_file(source_path)
-
             # Add file info
             st.info(f"""معلومات الملف ℹ️:
             - المسار: {selected_file}
-            - النوع: {os.path.splitext(selected_file)[1]}
-            - الحجم: {os.path.getsize(source_path) / 1024:.1f} KB""")
+            - النوع: {file_info[selected_file][1]}
+            - الحجم: {file_info[selected_file][0] / 1024:.1f} KB""")
 
-            # Split both texts into paragraphs
-            source_paragraphs = split_into_paragraphs(source_text)
+            # Split both texts into paragraphs; the source split is cached across reruns
+            source_paragraphs = source_paragraphs_for(source_path, os.path.getmtime(source_path))
             
             # Initialize or update translated paragraphs if file changed
             if st.session_state.current_file != selected_file:
                 st.session_state.current_file = selected_file
                 st.session_state.translated_paragraphs = split_into_paragraphs(translated_text)
+                st.session_state.review_page = 0
 
             # Create two columns
             col1, col2 = st.columns(2)
@@ -126,8 +164,26 @@ try:
                     add_paragraph_after(len(st.session_state.translated_paragraphs) - 1)
                     st.rerun()
 
-            # Display paragraphs
-            for i, source in enumerate(source_paragraphs):
+            # Page navigation
+            page_count = max(1, -(-len(source_paragraphs) // PARAGRAPHS_PER_PAGE))
+            st.session_state.review_page = min(st.session_state.review_page, page_count - 1)
+            nav_cols = st.columns([0.2, 0.6, 0.2])
+            with nav_cols[0]:
+                if st.button("⬅️ السابق", disabled=st.session_state.review_page == 0):
+                    st.session_state.review_page -= 1
+                    st.rerun()
+            with nav_cols[1]:
+                st.markdown(f"صفحة {st.session_state.review_page + 1} من {page_count}")
+            with nav_cols[2]:
+                if st.button("التالي ➡️", disabled=st.session_state.review_page >= page_count - 1):
+                    st.session_state.review_page += 1
+                    st.rerun()
+
+            # Display paragraphs of the current page
+            page_start = st.session_state.review_page * PARAGRAPHS_PER_PAGE
+            page_end = min(page_start + PARAGRAPHS_PER_PAGE, len(source_paragraphs))
+            for i in range(page_start, page_end):
+                source = source_paragraphs[i]
                 col1, col2 = st.columns(2)
                 
                 with col1:
@@ -177,6 +233,7 @@ try:
                         if st.session_state.delete_after_translation:
                             try:
                                 os.remove(source_path)
+                                _list_supported_files.clear()
                                 st.success(f"✅ تم حفظ الترجمة وحذف الملف الأصلي بنجاح!")
                                 # Rerun the app to update the file list
                                 st.rerun()
@@ -1,5 +1,11 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 import os
+import re
+import asyncio
+import json
+import time
+import hashlib
+import tempfile
 from pathlib import Path
 import frontmatter
 import markdown
@@ -9,16 +15,8 @@ from langchain_core.runnables import RunnablePassthrough
 from langchain_community.document_loaders import UnstructuredMarkdownLoader, UnstructuredHTMLLoader
 from langchain.text_splitter import MarkdownTextSplitter
 import nbformat
-from nbformat import NotebookNode
 
-class TranslationService:
-    def __init__(self, llm, glossary: Optional[Dict] = None):
-        self.llm = llm
-        self.glossary = glossary or {}
-        self.setup_translation_chain()
-        
-    def setup_translation_chain(self):
-        template = """You are a professional translator. Translate the following text to Arabic. 
+TRANSLATION_PROMPT = """You are a professional translator. Translate the following text to Arabic. 
         Keep all links, code blocks, images, and special tags unchanged. Only translate the actual text content.
         If any of these terms appear, use the specific translations provided: {glossary}
         
@@ -26,39 +24,234 @@ class TranslationService:
         {text}
         
         Translated text:"""
+
+BATCH_TRANSLATION_PROMPT = """You are a professional translator. Translate each of the following files to Arabic.
+        Each file starts with a <<<FILE path=...>>> line and ends with a <<<END>>> line.
+        Reproduce every marker line exactly as given and translate only the text between them.
+        Keep all links, code blocks, images, and special tags unchanged. Only translate the actual text content.
+        If any of these terms appear, use the specific translations provided: {glossary}
+        
+        Files to translate:
+        {text}
+        
+        Translated files:"""
+
+# Changes whenever a prompt is edited, so cached translations from an older prompt are ignored
+PROMPT_VERSION = hashlib.sha1((TRANSLATION_PROMPT + BATCH_TRANSLATION_PROMPT).encode()).hexdigest()[:12]
+
+# Upper bound on LLM requests in flight per service, shared by every file being
+# translated at once, to stay within provider rate limits
+MAX_CONCURRENT_REQUESTS = 8
+
+# Upper bound on files the translate views process at once; their requests share
+# the limit above, so this only bounds how many files are open at a time
+MAX_CONCURRENT_TRANSLATIONS = 4
+
+# Files estimated below this many tokens are worth packing into a shared request
+SMALL_FILE_TOKENS = 500
+
+# Opening lines of YAML, TOML and JSON frontmatter, the formats python-frontmatter detects
+_FRONTMATTER_STARTS = ('---', '+++', '{')
+
+_FILE_SECTION_RE = re.compile(r"<<<FILE path=(?P<path>[^>\n]+)>>>\n?(?P<body>.*?)\n?<<<END>>>", re.S)
+
+def _cell_source(cell: dict) -> str:
+    """A notebook cell's source as one string (the JSON may hold a list of lines)."""
+    source = cell.get('source', '')
+    return source if isinstance(source, str) else ''.join(source)
+
+def _markdown_cell(original: dict, source: str) -> dict:
+    """A v4 markdown cell with new source, keeping the original cell's id."""
+    cell = {'cell_type': 'markdown', 'metadata': {}, 'source': source.splitlines(keepends=True)}
+    if 'id' in original:
+        cell['id'] = original['id']
+    return cell
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return len(text) // 4
+
+class TranslationService:
+    def __init__(self, llm, glossary: Optional[Dict] = None, cache_dir: Optional[str] = ".translation_cache"):
+        """Args:
+            llm: LangChain chat model used for translation
+            glossary: Term -> translation mapping included in every prompt
+            cache_dir: Directory for cached translations, or None to disable caching
+        """
+        self.llm = llm
+        self.glossary = glossary or {}
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.model_name = getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__
+        # YAML loads terms like Yes/No/On/Off as booleans and numbers as ints; string keys
+        # keep json's sort_keys from comparing mixed types
+        self._glossary_terms = {str(term): translation for term, translation in self.glossary.items()}
+        # Serialized once; the prompt includes it for every chunk
+        self._glossary_str = json.dumps(self._glossary_terms, sort_keys=True, ensure_ascii=False, default=str)
+        self.glossary_hash = hashlib.sha1(self._glossary_str.encode()).hexdigest()
+        # Finds every glossary term in a text; the lookahead also catches terms that
+        # start inside or overlap another match, and longer terms are tried first
+        terms = sorted({term.lower() for term in self._glossary_terms} - {""}, key=len, reverse=True)
+        self._glossary_re = (
+            re.compile("(?=(" + "|".join(map(re.escape, terms)) + "))", re.IGNORECASE) if terms else None
+        )
+        # Chunk text hash -> translation; the model and glossary are fixed per instance
+        self._chunk_cache: Dict[str, str] = {}
+        self._splitters: Dict[int, MarkdownTextSplitter] = {}
+        # Output folders already created by _output_path
+        self._ensured_dirs: Set[Path] = set()
+        # Request limit for async translation and the event loop it belongs to
+        self._request_limit: Optional[asyncio.Semaphore] = None
+        self._request_limit_loop = None
+        self.setup_translation_chain()
         
-        prompt = PromptTemplate.from_template(template)
+    def setup_translation_chain(self):
+        prompt = PromptTemplate.from_template(TRANSLATION_PROMPT)
         self.translation_chain = (
-            {"text": RunnablePassthrough(), "glossary": lambda _: str(self.glossary)}
+            {"text": RunnablePassthrough(), "glossary": self._glossary_for}
             | prompt
             | self.llm
             | StrOutputParser()
         )
+        self.batch_translation_chain = (
+            {"text": RunnablePassthrough(), "glossary": self._glossary_for}
+            | PromptTemplate.from_template(BATCH_TRANSLATION_PROMPT)
+            | self.llm
+            | StrOutputParser()
+        )
+    
+    def _glossary_for(self, text: str) -> str:
+        """Serialize only the glossary entries whose terms occur in text, for its prompt."""
+        if self._glossary_re is None:
+            return self._glossary_str
+        # The longest term matching at a position; shorter terms matching there are its prefixes
+        hits = {match.group(1).lower() for match in self._glossary_re.finditer(text)}
+        entries = {
+            term: translation for term, translation in self._glossary_terms.items()
+            if any(hit.startswith(term.lower()) for hit in hits)
+        }
+        return json.dumps(entries, sort_keys=True, ensure_ascii=False, default=str)
+    
+    def _cache_path(self, content: str) -> Path:
+        key = hashlib.sha1(
+            content.encode() + self.model_name.encode() + self.glossary_hash.encode() + PROMPT_VERSION.encode()
+        ).hexdigest()
+        return self.cache_dir / f"{key}.json"
+    
+    def _get_cached_translation(self, content: str) -> Optional[str]:
+        """Return a previous translation of content with the same model, glossary and prompt."""
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._cache_path(content), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("prompt_version") != PROMPT_VERSION:
+            return None
+        return entry.get("translation")
+    
+    def _store_translation(self, content: str, translation: str):
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "translation": translation,
+            "model": self.model_name,
+            "timestamp": time.time(),
+            "prompt_version": PROMPT_VERSION
+        }
+        # Write to a temp file and rename, so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, self._cache_path(content))
     
     def split_text(self, text: str, max_tokens: int = 8292) -> List[str]:
-        splitter = MarkdownTextSplitter(chunk_size=max_tokens, chunk_overlap=100)
+        # Splitters are built once per chunk size and reused for every file
+        splitter = self._splitters.get(max_tokens)
+        if splitter is None:
+            splitter = self._splitters[max_tokens] = MarkdownTextSplitter(chunk_size=max_tokens, chunk_overlap=100)
         return splitter.split_text(text)
     
-    def translate_content(self, content: str) -> str:
-        chunks = self.split_text(content)
-        translated_chunks = []
-        
-        for chunk in chunks:
-            translated_chunk = self.translation_chain.invoke(chunk)
-            translated_chunks.append(translated_chunk)
-            
-        return "\n".join(translated_chunks)
+    def _pending_chunks(self, texts: List[str]) -> Tuple[List[List[str]], Dict[str, str]]:
+        """Split each text and return its chunks' memo keys, plus the distinct chunks
+        not translated yet by key."""
+        keys, pending = [], {}
+        for text in texts:
+            text_keys = []
+            for chunk in self.split_text(text):
+                key = hashlib.blake2b(chunk.encode(), digest_size=16).hexdigest()
+                if key not in self._chunk_cache:
+                    pending[key] = chunk
+                text_keys.append(key)
+            keys.append(text_keys)
+        return keys, pending
     
-    def process_file(self, file_path: str, base_output_dir: str, translation_folder: str) -> str:
-        """Process a single file for translation.
+    def _join_chunks(self, keys: List[List[str]]) -> List[str]:
+        return ["\n".join(self._chunk_cache[key] for key in text_keys) for text_keys in keys]
+    
+    def translate_texts(self, texts: List[str]) -> List[str]:
+        """Translate several texts, sending all of their uncached chunks as one batch."""
+        keys, pending = self._pending_chunks(texts)
+        if pending:
+            # Chunks are independent requests, so send them concurrently; batch keeps input order
+            translated_chunks = self.translation_chain.batch(
+                list(pending.values()), config={"max_concurrency": MAX_CONCURRENT_REQUESTS}
+            )
+            self._chunk_cache.update(zip(pending, translated_chunks))
+        return self._join_chunks(keys)
+    
+    def _async_request_limit(self) -> asyncio.Semaphore:
+        """The semaphore shared by all chunk requests on the running event loop.
         
-        Args:
-            file_path: Path to the input file
-            base_output_dir: Base directory for all translations
-            translation_folder: Specific folder name for this translation batch
+        Each asyncio.run starts a new loop and a semaphore can't be used across
+        loops, so a new one is made when the loop changes.
         """
-        file_path = Path(file_path)
+        loop = asyncio.get_running_loop()
+        if self._request_limit_loop is not loop:
+            self._request_limit = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+            self._request_limit_loop = loop
+        return self._request_limit
+    
+    async def _translate_chunk_async(self, chunk: str) -> str:
+        async with self._async_request_limit():
+            return await self.translation_chain.ainvoke(chunk)
+    
+    async def translate_texts_async(self, texts: List[str]) -> List[str]:
+        """Async counterpart of translate_texts.
         
+        Chunk requests from every file translated concurrently on the loop share one
+        limit of MAX_CONCURRENT_REQUESTS, rather than each call getting its own.
+        """
+        keys, pending = self._pending_chunks(texts)
+        if pending:
+            translated_chunks = await asyncio.gather(
+                *(self._translate_chunk_async(chunk) for chunk in pending.values())
+            )
+            self._chunk_cache.update(zip(pending, translated_chunks))
+        return self._join_chunks(keys)
+    
+    def translate_content(self, content: str) -> str:
+        return self.translate_texts([content])[0]
+    
+    async def translate_content_async(self, content: str) -> str:
+        """Async counterpart of translate_content."""
+        return (await self.translate_texts_async([content]))[0]
+    
+    def _translate_document(self, content: str, notebook: Optional[dict]) -> str:
+        """Translate what _read_file returned; for notebooks content is a JSON list of
+        markdown cell sources, translated cell by cell and returned in the same form."""
+        if notebook is None:
+            return self.translate_content(content)
+        return json.dumps(self.translate_texts(json.loads(content)), ensure_ascii=False)
+    
+    async def _translate_document_async(self, content: str, notebook: Optional[dict]) -> str:
+        if notebook is None:
+            return await self.translate_content_async(content)
+        return json.dumps(await self.translate_texts_async(json.loads(content)), ensure_ascii=False)
+    
+    def _output_path(self, file_path: Path, base_output_dir: str) -> Path:
+        """Map an input file to its output path and make sure its folder exists."""
         # Get the relative path from the input_files directory
         try:
             relative_path = file_path.relative_to(Path("input_files"))
@@ -73,98 +266,239 @@ class TranslationService:
         # Create the output path maintaining the directory structure
         # output_path = Path(base_output_dir) / translation_folder / relative_path
         output_path = Path(base_output_dir) / relative_path
-        os.makedirs(output_path.parent, exist_ok=True)
+        # Sibling files share folders, so only the first one pays for makedirs
+        if output_path.parent not in self._ensured_dirs:
+            os.makedirs(output_path.parent, exist_ok=True)
+            self._ensured_dirs.add(output_path.parent)
+            self._ensured_dirs.update(output_path.parent.parents)
+        return output_path
+    
+    def process_file(self, file_path: str, base_output_dir: str, translation_folder: str) -> Tuple[str, str]:
+        """Process a single file for translation.
+        
+        Args:
+            file_path: Path to the input file
+            base_output_dir: Base directory for all translations
+            translation_folder: Specific folder name for this translation batch
+        
+        Returns:
+            The output path and the exact text written to it
+        """
+        file_path = Path(file_path)
+        output_path = self._output_path(file_path, base_output_dir)
         
         # Read and translate content
-        content = self._read_file(file_path)
-        translated_content = self.translate_content(content)
+        content, notebook = self._read_file(file_path)
+        translated_content = self._get_cached_translation(content)
+        if translated_content is None:
+            translated_content = self._translate_document(content, notebook)
+            self._store_translation(content, translated_content)
         
         # Save translated content
-        self._write_file(output_path, translated_content, file_path.suffix)
-        return str(output_path)
+        written = self._write_file(output_path, translated_content, file_path.suffix, notebook)
+        return str(output_path), written
     
-    def _read_file(self, file_path: Path) -> str:
+    async def process_file_async(self, file_path: str, base_output_dir: str, translation_folder: str) -> Tuple[str, str]:
+        """Async counterpart of process_file, so several files can be translated concurrently.
+        
+        Disk reads and writes run in worker threads, so other files' reads, writes and
+        LLM requests keep going on the event loop meanwhile.
+        """
+        file_path = Path(file_path)
+        output_path = await asyncio.to_thread(self._output_path, file_path, base_output_dir)
+        
+        content, notebook = await asyncio.to_thread(self._read_file, file_path)
+        translated_content = await asyncio.to_thread(self._get_cached_translation, content)
+        if translated_content is None:
+            translated_content = await self._translate_document_async(content, notebook)
+            await asyncio.to_thread(self._store_translation, content, translated_content)
+        
+        written = await asyncio.to_thread(self._write_file, output_path, translated_content, file_path.suffix, notebook)
+        return str(output_path), written
+    
+    @staticmethod
+    def can_batch(file_path: str) -> bool:
+        """Whether a file is small and flat enough for process_files_batch."""
+        return (
+            Path(file_path).suffix.lower() != '.ipynb'
+            and os.path.getsize(file_path) // 4 <= SMALL_FILE_TOKENS
+        )
+    
+    def process_files_batch(self, file_paths: List[str], base_output_dir: str, translation_folder: str,
+                            max_input_tokens: int = 6000) -> List[Tuple[Optional[str], Optional[str], Optional[Exception]]]:
+        """Translate several small files with one LLM request per group of files.
+        
+        Files are packed in order into groups of at most max_input_tokens, each file
+        wrapped in <<<FILE path=...>>> / <<<END>>> markers, and the response is split
+        back per file. Files that don't fit a group on their own, notebooks, any file
+        missing from the response, and the files of a group whose request failed are
+        translated individually.
+        
+        Returns (output_path, written text, error) for each input, in order; a failing
+        file gets (None, None, error) and doesn't stop the others.
+        """
+        results = {}
+        
+        def process_single(file_path: Path):
+            try:
+                results[str(file_path)] = (*self.process_file(str(file_path), base_output_dir, translation_folder), None)
+            except Exception as e:
+                results[str(file_path)] = (None, None, e)
+        
+        pending = []
+        for file_path in file_paths:
+            file_path = Path(file_path)
+            if file_path.suffix.lower() == '.ipynb':
+                process_single(file_path)
+                continue
+            
+            try:
+                content, _ = self._read_file(file_path)
+                cached = self._get_cached_translation(content)
+                if cached is not None:
+                    results[str(file_path)] = (*self._save_translation(file_path, base_output_dir, cached), None)
+                elif estimate_tokens(content) > max_input_tokens:
+                    process_single(file_path)
+                else:
+                    pending.append((file_path, content))
+            except Exception as e:
+                results[str(file_path)] = (None, None, e)
+        
+        # Pack consecutive files into groups within the token budget
+        groups, group, group_tokens = [], [], 0
+        for file_path, content in pending:
+            tokens = estimate_tokens(content)
+            if group and group_tokens + tokens > max_input_tokens:
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append((file_path, content))
+            group_tokens += tokens
+        if group:
+            groups.append(group)
+        
+        prompts = [
+            "\n".join(f"<<<FILE path={file_path}>>>\n{content}\n<<<END>>>" for file_path, content in group)
+            for group in groups
+        ]
+        responses = (
+            self.batch_translation_chain.batch(
+                prompts, config={"max_concurrency": MAX_CONCURRENT_REQUESTS}, return_exceptions=True
+            ) if prompts else []
+        )
+        
+        for group, response in zip(groups, responses):
+            if isinstance(response, Exception):
+                for file_path, _ in group:
+                    process_single(file_path)
+                continue
+            sections = {m['path'].strip(): m['body'] for m in _FILE_SECTION_RE.finditer(response)}
+            for file_path, content in group:
+                try:
+                    translated = sections.get(str(file_path))
+                    if translated is None:
+                        translated = self.translate_content(content)
+                    self._store_translation(content, translated)
+                    results[str(file_path)] = (*self._save_translation(file_path, base_output_dir, translated), None)
+                except Exception as e:
+                    results[str(file_path)] = (None, None, e)
+        
+        return [results[str(Path(file_path))] for file_path in file_paths]
+    
+    def _save_translation(self, file_path: Path, base_output_dir: str, translated_content: str) -> Tuple[str, str]:
+        """Write translated text for a non-notebook file and return (output_path, written text)."""
+        output_path = self._output_path(file_path, base_output_dir)
+        written = self._write_file(output_path, translated_content, file_path.suffix)
+        return str(output_path), written
+    
+    def _read_file(self, file_path: Path) -> Tuple[str, Optional[dict]]:
+        """Return the text to translate and, for notebooks, the parsed notebook."""
         suffix = file_path.suffix.lower()
         
         if suffix in ['.md', '.mdx']:
-            post = frontmatter.load(file_path)
-            return post.content
-        elif suffix in ['.rst', '.rstx']:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            return self._read_markdown(file_path), None
+        elif suffix in ['.rst', '.rstx', '.py']:
+            return file_path.read_text(encoding='utf-8'), None
         elif suffix == '.html':
             loader = UnstructuredHTMLLoader(str(file_path))
-            return loader.load()[0].page_content
-        elif suffix == '.py':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            return loader.load()[0].page_content, None
         elif suffix == '.ipynb':
             return self._read_notebook(file_path)
         else:
             raise ValueError(f"Unsupported file type: {suffix}")
     
-    def _write_file(self, output_path: Path, content: str, suffix: str):
+    def _read_markdown(self, file_path: Path) -> str:
+        """Return a markdown file's body without its frontmatter, as frontmatter.load would.
+        
+        Only the body is translated, so the frontmatter is split off but never parsed,
+        and files that can't start with frontmatter skip the format detection entirely.
+        """
+        text = file_path.read_text(encoding='utf-8').strip()
+        if not text.startswith(_FRONTMATTER_STARTS):
+            return text
+        handler = frontmatter.detect_format(text, frontmatter.handlers)
+        if handler is None:
+            return text
+        try:
+            _, content = handler.split(text)
+        except ValueError:
+            # An opening delimiter without a closing one, e.g. a leading "---" rule
+            return text
+        return content.strip()
+    
+    def _write_file(self, output_path: Path, content: str, suffix: str, notebook: Optional[dict] = None) -> str:
+        """Serialize translated content for its file type, write it and return the written text."""
         if suffix in ['.md', '.mdx']:
             post = frontmatter.loads('')
             post.content = content
-            frontmatter.dump(post, output_path)
+            text = frontmatter.dumps(post)
         elif suffix == '.ipynb':
-            self._write_notebook(output_path, content)
+            text = self._render_notebook(notebook, content)
         else:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            text = content
+        
+        # Encode once and write in a single call, bypassing text-mode buffering
+        Path(output_path).write_bytes(text.encode('utf-8'))
+        return text
 
-    def _read_notebook(self, file_path: Path) -> str:
-        """Read a Jupyter notebook and extract markdown cells for translation."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            notebook = nbformat.read(f, as_version=4)
-            # Normalize the notebook to add missing cell IDs
-            notebook = nbformat.v4.upgrade(notebook)
-            nbformat.validate(notebook)
+    def _read_notebook(self, file_path: Path) -> Tuple[str, dict]:
+        """Read a Jupyter notebook and extract markdown cells for translation, as a JSON list.
         
-        # Store the original notebook structure in memory
-        self._current_notebook = notebook
+        v4 notebooks are parsed with plain json rather than nbformat, which would
+        validate the whole document against its schema; only older formats are
+        converted through nbformat. The notebook itself is returned alongside the
+        text rather than stored on the service, so concurrent translations don't
+        overwrite each other.
+        """
+        with open(file_path, 'r', encoding='utf-8') as f:
+            notebook = json.load(f)
+        if notebook.get('nbformat') != 4:
+            notebook = nbformat.reads(json.dumps(notebook), as_version=4)
         
-        # Extract only markdown cells
+        # Extract only markdown cells; sources may be stored as lists of lines
         markdown_contents = []
-        for cell in notebook.cells:
-            if cell.cell_type == 'markdown':
-                markdown_contents.append(cell.source)
+        for cell in notebook['cells']:
+            if cell['cell_type'] == 'markdown':
+                markdown_contents.append(_cell_source(cell))
         
-        # Join markdown contents with a special separator that we can split on later
-        return '\n<<<CELL_SEPARATOR>>>\n'.join(markdown_contents)
+        # Cells are translated separately and put back by position, so return them as a list
+        return json.dumps(markdown_contents, ensure_ascii=False), notebook
     
-    def _write_notebook(self, output_path: Path, translated_content: str):
-        """Write the translated notebook, preserving code cells and outputs."""
-        if not hasattr(self, '_current_notebook'):
+    def _render_notebook(self, notebook: Optional[dict], translated_content: str) -> str:
+        """Build the translated notebook JSON, preserving code cells and outputs."""
+        if notebook is None:
             raise ValueError("No notebook structure found. Please read a notebook first.")
         
-        # Split the translated content back into cells
-        translated_cells = translated_content.split('\n<<<CELL_SEPARATOR>>>\n')
-        
-        # Create a new notebook with the same metadata
-        new_notebook = nbformat.v4.new_notebook(metadata=self._current_notebook.metadata)
+        translated_cells = json.loads(translated_content)
         
-        # Counter for markdown cells
+        # Reconstruct the notebook, matching markdown cells to translations by position
+        cells = []
         markdown_idx = 0
+        for cell in notebook['cells']:
+            if cell['cell_type'] == 'markdown' and markdown_idx < len(translated_cells):
+                cell = _markdown_cell(cell, translated_cells[markdown_idx])
+                markdown_idx += 1
+            # Code cells and their outputs are preserved exactly as they are
+            cells.append(cell)
         
-        # Reconstruct the notebook
-        for cell in self._current_notebook.cells:
-            if cell.cell_type == 'markdown':
-                # Replace markdown content with translated content
-                if markdown_idx < len(translated_cells):
-                    new_cell = nbformat.v4.new_markdown_cell(translated_cells[markdown_idx])
-                    markdown_idx += 1
-            else:
-                # Preserve code cells and their outputs exactly as they are
-                new_cell = cell
-            
-            new_notebook.cells.append(new_cell)
-        
-        # Normalize the notebook to add missing cell IDs
-        new_notebook = nbformat.v4.upgrade(new_notebook)
-        nbformat.validate(new_notebook)
-        
-        # Write the notebook
-        with open(output_path, 'w', encoding='utf-8') as f:
-            nbformat.write(new_notebook, f)
+        # Serialize the notebook the same way nbformat.write does
+        return json.dumps({**notebook, 'cells': cells}, sort_keys=True, indent=1, ensure_ascii=False) + '\n'
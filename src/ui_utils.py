@@ -0,0 +1,91 @@
+import os
+import time
+import yaml
+import streamlit as st
+
+from config import AppConfig, YamlLoader
+
+# Lower-cased, as a tuple so str.endswith can test them all in one call
+SUFFIXES = tuple(ext.lower() for ext in AppConfig.supported_file_types)
+
+def throttled_progress(progress_bar, progress_text, interval: float = 0.1):
+    """Return tick(done, total, label), which redraws progress at most once per interval
+    and always for the last item, instead of sending an update per file."""
+    last_update = 0.0
+
+    def tick(done: int, total: int, label: str):
+        nonlocal last_update
+        now = time.monotonic()
+        if done == total or now - last_update >= interval:
+            progress_bar.progress(done / total)
+            progress_text.text(label)
+            last_update = now
+
+    return tick
+
+def reset_editor(key: str):
+    """Drop a data_editor's pending edits so it is rebuilt from its input data.
+
+    The selection tables are built from a base selection that only changes together
+    with such a reset (Select All / Deselect All, fetching, deleting, translating,
+    uploading), never from the editor's output: writing edits back would change the
+    data the editor's identity is hashed from, and the next edit would be lost.
+    """
+    st.session_state.pop(key, None)
+
+def keep_selection(selected: set, repo_files: list, selected_files: list):
+    """Make a repo's current table selection the base for its next, reset table.
+
+    selected is the page's base selection of paths, updated in place; files deleted,
+    translated or uploaded meanwhile are left out.
+    """
+    selected.difference_update(file['path'] for file in repo_files)
+    selected.update(file['path'] for file in selected_files if os.path.exists(file['path']))
+
+def remember_translation(output_path: str, content: str):
+    """Keep translated text in memory so the upload page doesn't have to re-read it.
+
+    The file's mtime is stored alongside, so edits made afterwards invalidate it.
+    """
+    st.session_state.translated_contents[output_path] = (os.stat(output_path).st_mtime_ns, content)
+
+@st.cache_data(show_spinner=False)
+def parse_glossary_bytes(raw: bytes) -> dict:
+    """Parse an uploaded glossary, cached by its contents."""
+    return yaml.load(raw, Loader=YamlLoader)
+
+def dir_mtime_key(base_dir: str):
+    """Newest mtime among base_dir and every directory below it, or None if it doesn't exist.
+
+    Adding, removing or renaming a file changes its directory's mtime, so this catches
+    changes at any depth (including ones made from another page) while only
+    directories are stat'ed.
+    """
+    try:
+        newest = os.stat(base_dir).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    stack = [base_dir]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    newest = max(newest, entry.stat(follow_symlinks=False).st_mtime_ns)
+                    stack.append(entry.path)
+    return newest
+
+def scan_files(dir_path: str):
+    """Yield DirEntry objects for the supported files below dir_path."""
+    stack = [dir_path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(SUFFIXES) and entry.is_file():
+                    yield entry
+
+def is_empty_dir(path: str) -> bool:
+    """Check for emptiness by reading at most one directory entry."""
+    with os.scandir(path) as entries:
+        return next(entries, None) is None